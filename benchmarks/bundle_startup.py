@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark of the time a fresh process takes to render a project, from template sources or a bundle.
+
+Each run starts a new Python process, which loads a template and renders a
+project into memory.  The template is loaded from its sources, with and without
+a (warm) bytecode cache, and from a precompiled bundle written by
+``ProjectTemplate.compile_bundle``.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from latex_templates import ProjectTemplate, search_paths  # noqa: E402
+
+RENDER = """
+import sys
+from pathlib import Path
+sys.path.insert(0, {package!r})
+from latex_templates import MemorySink, ProjectTemplate, open_bytecode_cache, search_paths
+
+template_path, lib_path = search_paths()
+root, cache_dir = Path({root!r}), {cache_dir!r}
+cache = None if cache_dir is None else open_bytecode_cache(Path(cache_dir))
+ProjectTemplate(root, lib_path, bytecode_cache=cache).generate({{}}, MemorySink())
+"""
+
+
+def time_process(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--template",
+        default="notes",
+        help="Name of the template to render [default=notes]",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=10, help="Number of runs of each mode [default=10]"
+    )
+    args = parser.parse_args()
+
+    template_path, lib_path = search_paths()
+    template = ProjectTemplate.find(args.template, template_path, lib_path)
+    package = str(Path(__file__).resolve().parent.parent)
+
+    with TemporaryDirectory() as tmp:
+        bundle = template.compile_bundle(Path(tmp) / "bundle")
+        modes = [
+            ("sources", template.root_dir, None),
+            ("bytecode cache", template.root_dir, str(Path(tmp) / "cache")),
+            ("bundle", bundle, None),
+        ]
+        timings = {}
+        for label, root, cache_dir in modes:
+            code = RENDER.format(package=package, root=str(root), cache_dir=cache_dir)
+            time_process(code)  # warm up the OS caches and the bytecode cache
+            timings[label] = [time_process(code) for _ in range(args.runs)]
+
+    print(f"rendering {args.template} in a new process, best of {args.runs} runs")
+    baseline = min(timings["sources"])
+    for label, runs in timings.items():
+        print(
+            f"  {label + ':':16} {1000 * min(runs):8.1f} ms "
+            f"(median {1000 * statistics.median(runs):.1f} ms) "
+            f"{baseline / min(runs):6.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Benchmark of serial vs parallel generation of a synthetic project with many files.
+
+The synthetic template consists of a main file including many section
+templates, and of raw assets copied as-is.  Each run generates the project into
+a fresh directory, so that every file is rendered and written.  Use
+``--target-dir`` to measure on a particular (e.g. network) filesystem.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from latex_templates import ProjectTemplate  # noqa: E402
+
+SECTION_TEMPLATE = r"""\section{\EXPR{ title } \EXPR{ number }}
+%%$ for paragraph in range(paragraphs)
+\label{sec:\EXPR{ number }-\EXPR{ paragraph }}
+%%$ for author in authors
+\EXPR{ author } wrote paragraph \EXPR{ paragraph } of section \EXPR{ number }.
+%%$ endfor
+%%$ endfor
+"""
+
+
+def create_template(root: Path, files: int, raw_fraction: float, asset_size: int):
+    """Write a template with the given number of files, of which a fraction are raw assets."""
+    raw = int(files * raw_fraction)
+    sections = files - raw - 1
+    root.mkdir(parents=True)
+    (root / "sections").mkdir()
+    (root / "assets").mkdir()
+
+    (root / "default-conf.yaml").write_text(
+        "title: Synthetic\nauthors: [Alice, Bob, Carol]\nparagraphs: 20\n"
+    )
+    entries = ["- src: main.tex\n  main: true"]
+    main = [r"\documentclass{article}", r"\begin{document}"]
+    for i in range(sections):
+        name = f"sections/section{i:04}.tex"
+        (root / name).write_text(SECTION_TEMPLATE.replace(r"\EXPR{ number }", str(i)))
+        entries.append(f"- {name}")
+        main.append(rf"\input{{{name}}}")
+    main.append(r"\end{document}")
+    (root / "main.tex").write_text("\n".join(main) + "\n")
+
+    for i in range(raw):
+        name = f"assets/asset{i:04}.bin"
+        (root / name).write_bytes(os.urandom(asset_size))
+        entries.append(f"- src: {name}\n  raw: true")
+    (root / "contents.yaml").write_text("\n".join(entries) + "\n")
+
+
+def measure(template: ProjectTemplate, target_dir: Path, workers, runs: int):
+    timings = []
+    for run in range(runs):
+        out = target_dir / f"{workers or 1}-{run}"
+        start = time.perf_counter()
+        report = template.generate({}, out, only_changed=False, workers=workers)
+        timings.append(time.perf_counter() - start)
+        shutil.rmtree(str(out))
+    return timings, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--files", type=int, default=500, help="Number of files [default=500]"
+    )
+    parser.add_argument(
+        "--raw-fraction",
+        type=float,
+        default=0.2,
+        help="Fraction of raw assets among the files [default=0.2]",
+    )
+    parser.add_argument(
+        "--asset-size",
+        type=int,
+        default=256 * 1024,
+        help="Size of each raw asset in bytes [default=262144]",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of threads for parallel generation [default=8]",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Number of runs of each mode [default=5]"
+    )
+    parser.add_argument(
+        "--target-dir",
+        type=Path,
+        default=None,
+        help="Directory where the projects are generated [default=a temporary directory]",
+    )
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        root = Path(tmp) / "synthetic"
+        create_template(root, args.files, args.raw_fraction, args.asset_size)
+        target_dir = args.target_dir or Path(tmp) / "out"
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+        template = ProjectTemplate(root, [])
+        template.generate({}, target_dir / "warmup", workers=args.workers)
+        shutil.rmtree(str(target_dir / "warmup"))
+
+        serial, report = measure(template, target_dir, None, args.runs)
+        parallel, _ = measure(template, target_dir, args.workers, args.runs)
+
+    print(f"generated {len(report.written)} files, best of {args.runs} runs")
+    for label, timings in [("serial", serial), (f"{args.workers} workers", parallel)]:
+        print(
+            f"  {label + ':':12} {1000 * min(timings):8.1f} ms "
+            f"(median {1000 * statistics.median(timings):.1f} ms)"
+        )
+    print(f"  {'speedup:':12} {min(serial) / min(parallel):8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
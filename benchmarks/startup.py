@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Startup benchmark for the ``latex_templates`` package, based on ``python -X importtime``.
+
+Fails (with exit code 1) if importing the package takes longer than the given
+budget, or if it imports any of the dependencies that should only be loaded
+on the code paths that need them.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from typing import Set, Tuple
+
+PACKAGE = "latex_templates"
+LAZY_MODULES = ["jinja2", "yaml", "argcomplete", "pkg_resources", "subprocess"]
+DEFAULT_BUDGET_MS = 80.0
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)$")
+
+
+def measure_import() -> Tuple[float, Set[str]]:
+    """Import the package in a fresh interpreter, returning the cumulative time in ms and all imported modules."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {PACKAGE}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    cumulative, modules = None, set()
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        modules.add(match.group(4))
+        if match.group(4) == PACKAGE:
+            cumulative = int(match.group(2)) / 1000
+    return cumulative, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help=f"Maximum import time in milliseconds [default={DEFAULT_BUDGET_MS}]",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Number of measurements, of which the fastest is used [default=5]",
+    )
+    args = parser.parse_args()
+
+    timings, modules = [], set()
+    for _ in range(args.runs):
+        elapsed, imported = measure_import()
+        timings.append(elapsed)
+        modules |= imported
+
+    best = min(timings)
+    print(f"import {PACKAGE}: best {best:.1f} ms, worst {max(timings):.1f} ms")
+
+    failed = False
+    eagerly_imported = [
+        module
+        for module in LAZY_MODULES
+        if any(m == module or m.startswith(module + ".") for m in modules)
+    ]
+    if eagerly_imported:
+        print(f"FAIL: imported at startup: {', '.join(eagerly_imported)}")
+        failed = True
+    if best > args.budget_ms:
+        print(f"FAIL: exceeds the budget of {args.budget_ms:.1f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for finding, rendering, generating and compiling templates.
+
+Covers the bundled ``notes`` and ``letter-din`` templates as well as synthetic
+templates (many files, deep include chains, big loops over sections), batch
+generation and the validation of configs.  LaTeX compilation is measured against
+a stub ``latexmk``, so no TeX installation is needed; the timings thus reflect
+the overhead of this package.
+
+Results may be written as JSON with ``--output``, and compared against a
+previous run with ``--compare``, which fails (with exit code 1) if the fastest
+run of any benchmark regressed by more than ``--max-regression``.  The fastest
+run is compared because it is the least affected by noise from other processes.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from latex_templates import ProjectTemplate, search_paths  # noqa: E402
+from parallel_generation import create_template  # noqa: E402
+
+STUB_LATEXMK = """#!{python}
+import sys
+from pathlib import Path
+
+main_file = Path(sys.argv[-1])
+main_file.with_suffix(".pdf").write_bytes(b"%PDF-1.4\\n%stub\\n" + main_file.read_bytes())
+"""
+
+INCLUDE_TEMPLATE = r"""%%$ set depth = {depth}
+\section{{Level \EXPR{{ depth }}}}
+%%$ for author in authors
+\EXPR{{ author }} at level \EXPR{{ depth }}.
+%%$ endfor
+{include}
+"""
+
+
+class Context:
+    """Scratch space and lookup paths shared by the benchmarks."""
+
+    def __init__(self, tmp: Path):
+        self.tmp = tmp
+        self.template_path, self.lib_path = search_paths()
+        self.__counter = itertools.count()
+
+    def fresh_dir(self) -> Path:
+        return self.tmp / "out" / str(next(self.__counter))
+
+    def find(self, name: str) -> ProjectTemplate:
+        return ProjectTemplate.find(name, self.template_path, self.lib_path)
+
+    def unique_config(self, **config) -> dict:
+        """A config that was never rendered before, defeating the memoization of the contents."""
+        return {**config, "benchmark_run": next(self.__counter)}
+
+
+Setup = Callable[[Context], Callable[[], object]]
+BENCHMARKS: List[Tuple[str, Setup]] = []
+
+
+def benchmark(name: str):
+    """Register a benchmark, given by a setup function returning the callable to be timed."""
+
+    def register(setup: Setup) -> Setup:
+        BENCHMARKS.append((name, setup))
+        return setup
+
+    return register
+
+
+@benchmark("search_paths")
+def bench_search_paths(ctx: Context):
+    return search_paths
+
+
+for _name in ["notes", "letter-din"]:
+
+    @benchmark(f"find/{_name}")
+    def bench_find(ctx: Context, name=_name):
+        return lambda: ctx.find(name)
+
+    @benchmark(f"get_generated_files/{_name}")
+    def bench_generated_files(ctx: Context, name=_name):
+        template = ctx.find(name)
+        return lambda: template.get_generated_files(ctx.unique_config())
+
+    @benchmark(f"generate/{_name}")
+    def bench_generate(ctx: Context, name=_name):
+        template = ctx.find(name)
+        return lambda: template.generate({}, ctx.fresh_dir())
+
+    @benchmark(f"regenerate/{_name}")
+    def bench_regenerate(ctx: Context, name=_name):
+        template, target_dir = ctx.find(name), ctx.fresh_dir()
+        template.generate({}, target_dir)
+        return lambda: template.generate({}, target_dir)
+
+
+@benchmark("synthetic/many-files")
+def bench_many_files(ctx: Context):
+    root = ctx.tmp / "many-files"
+    create_template(root, files=500, raw_fraction=0.2, asset_size=4096)
+    template = ProjectTemplate(root, [])
+    return lambda: template.generate({}, ctx.fresh_dir())
+
+
+@benchmark("synthetic/deep-includes")
+def bench_deep_includes(ctx: Context, depth: int = 50):
+    root = ctx.tmp / "deep-includes"
+    root.mkdir()
+    for level in range(depth):
+        include = (
+            rf"\STMT{{ include 'level{level + 1}.tex' }}" if level + 1 < depth else ""
+        )
+        (root / f"level{level}.tex").write_text(
+            INCLUDE_TEMPLATE.format(depth=level, include=include)
+        )
+    (root / "default-conf.yaml").write_text("authors: [Alice, Bob]\n")
+    (root / "contents.yaml").write_text("- src: level0.tex\n  tgt: main.tex\n")
+    template = ProjectTemplate(root, [])
+    return lambda: template.generate(ctx.unique_config(), ctx.fresh_dir())
+
+
+@benchmark("synthetic/big-loop")
+def bench_big_loop(ctx: Context, sections: int = 2000):
+    template = ctx.find("notes")
+    config = {
+        "sections": [
+            {"title": f"Section {i}", "label": f"sec{i}"} for i in range(sections)
+        ]
+    }
+    return lambda: template.generate(config, ctx.fresh_dir())
+
+
+@benchmark("batch/notes-100")
+def bench_batch(ctx: Context, size: int = 100):
+    template = ctx.find("notes")
+    configs = [{"name": f"notes{i}", "title": f"Notes {i}"} for i in range(size)]
+
+    def run():
+        target_dir = ctx.fresh_dir()
+        template.generate_many(configs, str(target_dir) + r"/\EXPR{ name }")
+
+    return run
+
+
+@benchmark("validate/letter-din-10000")
+def bench_validate(ctx: Context, size: int = 10000):
+    template = ctx.find("letter-din")
+    configs = [
+        {
+            "name": f"letter{i}",
+            "subject": f"Invoice {i}",
+            "toaddr": [f"Customer {i}", f"{i:05} City"],
+            "sender": {"name": "Alice"},
+        }
+        for i in range(size)
+    ]
+
+    def run():
+        for config in configs:
+            template.validate(config)
+
+    return run
+
+
+@benchmark("compile/notes")
+def bench_compile(ctx: Context):
+    template = ctx.find("notes")
+    return lambda: template.compile_pdf({}, build_dir=ctx.fresh_dir())
+
+
+@benchmark("compile_many/notes-16")
+def bench_compile_many(ctx: Context, size: int = 16):
+    template = ctx.find("notes")
+    configs = [{"name": f"notes{i}"} for i in range(size)]
+    return lambda: template.compile_pdf_many(configs, jobs=4)
+
+
+def install_stub_latexmk(directory: Path):
+    """Put a stub ``latexmk``, which just writes a PDF file, first on the PATH."""
+    directory.mkdir(parents=True, exist_ok=True)
+    stub = directory / "latexmk"
+    stub.write_text(STUB_LATEXMK.format(python=sys.executable))
+    stub.chmod(0o755)
+    os.environ["PATH"] = str(directory) + os.pathsep + os.environ.get("PATH", "")
+
+
+def measure(run: Callable[[], object], runs: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        run()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return {
+        "runs": runs,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "max": max(timings),
+    }
+
+
+def compare(
+    results: Dict[str, dict], baseline: Dict[str, dict], max_regression: float
+) -> bool:
+    """Print the ratio of each fastest run to the baseline, returning whether none regressed."""
+    ok = True
+    print(f"\n{'benchmark':<32} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["min"], result["min"]
+        ratio = after / before if before > 0 else float("inf")
+        flag = ""
+        if ratio > max_regression:
+            flag, ok = "  REGRESSION", False
+        print(
+            f"{name:<32} {1000 * before:>12.2f} {1000 * after:>12.2f} {ratio:>7.2f}{flag}"
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--runs", type=int, default=10, help="Timed runs per benchmark [default=10]"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="Untimed runs per benchmark [default=1]"
+    )
+    parser.add_argument(
+        "--filter",
+        "-k",
+        metavar="SUBSTRING",
+        default=None,
+        help="Only run the benchmarks whose name contains SUBSTRING.",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        metavar="FILE",
+        type=Path,
+        default=None,
+        help="Write the results as JSON to FILE.",
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="FILE",
+        type=Path,
+        default=None,
+        help="Compare the results with those of a previous run, written by --output.",
+    )
+    parser.add_argument(
+        "--max-regression",
+        metavar="RATIO",
+        type=float,
+        default=1.25,
+        help="Maximum ratio of a fastest run to its baseline for --compare [default=1.25]",
+    )
+    args = parser.parse_args()
+
+    results: Dict[str, dict] = {}
+    with TemporaryDirectory() as tmp:
+        install_stub_latexmk(Path(tmp) / "bin")
+        ctx = Context(Path(tmp))
+        print(f"{'benchmark':<32} {'min ms':>10} {'median ms':>10} {'max ms':>10}")
+        for name, setup in BENCHMARKS:
+            if args.filter is not None and args.filter not in name:
+                continue
+            result = measure(setup(ctx), args.runs, args.warmup)
+            results[name] = result
+            print(
+                f"{name:<32} {1000 * result['min']:>10.2f} "
+                f"{1000 * result['median']:>10.2f} {1000 * result['max']:>10.2f}"
+            )
+
+    if args.output is not None:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with open(str(args.output), "w") as out:
+            json.dump(report, out, indent=2)
+            out.write("\n")
+
+    ok = True
+    if args.compare is not None:
+        with open(str(args.compare)) as baseline:
+            ok = compare(results, json.load(baseline)["results"], args.max_regression)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
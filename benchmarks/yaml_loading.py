@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark of YAML loaders on a large multi-document batch of letter configs.
+
+Compares the pure-Python ``FullLoader`` (used by ``yaml.full_load``), the
+pure-Python ``SafeLoader`` and libyaml's ``CSafeLoader`` (if PyYAML was built
+with it), as well as reading the batch with ``iter_configs``.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from latex_templates.configs import iter_configs  # noqa: E402
+
+LETTER = """---
+name: letter{index}
+lang: en
+subject: Invoice {index}
+toaddr:
+  - Customer {index}
+  - Street {index}
+  - {index:05} City
+opening: Dear customer {index},
+body: |
+  please find attached the invoice number {index}, which is due within
+  thirty days.  Do not hesitate to contact us if you have any questions.
+closing: Kind regards,
+enclosures:
+  - pdf: invoice{index}.pdf
+    pages: 1-2
+"""
+
+
+def write_batch(path: Path, configs: int):
+    with open(str(path), "w") as batch:
+        for index in range(configs):
+            batch.write(LETTER.format(index=index))
+
+
+def time_loader(path: Path, loader) -> float:
+    start = time.perf_counter()
+    with open(str(path)) as batch:
+        for _ in yaml.load_all(batch, Loader=loader):
+            pass
+    return time.perf_counter() - start
+
+
+def time_iter_configs(path: Path) -> float:
+    start = time.perf_counter()
+    for _ in iter_configs(path):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--configs",
+        type=int,
+        default=20000,
+        help="Number of configs in the batch [default=20000]",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=3, help="Number of runs of each loader [default=3]"
+    )
+    args = parser.parse_args()
+
+    loaders = [("FullLoader", yaml.FullLoader), ("SafeLoader", yaml.SafeLoader)]
+    if hasattr(yaml, "CSafeLoader"):
+        loaders.append(("CSafeLoader", yaml.CSafeLoader))
+    else:
+        print("PyYAML was built without libyaml, CSafeLoader is not available")
+
+    with TemporaryDirectory() as tmp:
+        path = Path(tmp) / "batch.yaml"
+        write_batch(path, args.configs)
+        megabytes = path.stat().st_size / 1e6
+        print(f"{args.configs} configs, {megabytes:.1f} MB, best of {args.runs} runs")
+
+        timings = {
+            name: min(time_loader(path, loader) for _ in range(args.runs))
+            for name, loader in loaders
+        }
+        timings["iter_configs"] = min(time_iter_configs(path) for _ in range(args.runs))
+
+    baseline = timings["FullLoader"]
+    for name, elapsed in timings.items():
+        print(
+            f"  {name + ':':14} {elapsed:8.2f} s {megabytes / elapsed:8.1f} MB/s "
+            f"{baseline / elapsed:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,96 @@
 #!/usr/bin/env python
 
 import argparse
+import copy
+import functools
+import hashlib
+import json
 import os
 import runpy
 import shutil
-import subprocess
 import sys
 import textwrap
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Sequence
+from contextlib import ExitStack
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
-
-import argcomplete
-import jinja2
-import pkg_resources
-import yaml
-from argcomplete.completers import DirectoriesCompleter, FilesCompleter
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from . import cache, registry, timing
+from .build import (
+    BUILDS_SUBDIR,
+    BuildDirPool,
+    BuildError,
+    BuildResult,
+    BuildScheduler,
+    arun_latexmk,
+    config_identity,
+    latexmk_command,
+    run_latexmk,
+)
+from .configs import (
+    ConfigView,
+    enable_tags,
+    freeze,
+    iter_configs,
+    load_config,
+    load_yaml,
+    to_json,
+)
+from .output import COPY_STRATEGIES, FileSignature, GenerationReport, file_signature
+from .schema import InvalidConfigError, Schema
+from .sinks import ArchiveSink, DiskSink, MemorySink, OutputSink
+
+# Heavy dependencies are imported only where needed, to keep the startup of
+# the command line (and of shell completion) fast.
+if TYPE_CHECKING:
+    import asyncio
+
+    import jinja2
 
 __all__ = [
     "ProjectTemplate",
     "SearchPath",
     "GeneratedFile",
+    "BuildError",
+    "BuildResult",
+    "GenerationReport",
+    "OutputSink",
+    "DiskSink",
+    "MemorySink",
+    "ArchiveSink",
     "ProjectTemplateNotFoundError",
+    "InvalidConfigError",
+    "Schema",
 ]
 
 SearchPath = List[Path]
 
 
+def config_digest(config: dict) -> Optional[str]:
+    """Compute a stable hash of a configuration, or None if it cannot be serialized."""
+    try:
+        serialized = json.dumps(config, sort_keys=True, default=to_json)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
 class GeneratedFile(NamedTuple):
     src: Path
     tgt: Path
@@ -86,6 +150,9 @@ class ProjectTemplate:
       Can only be true for a single TeX file.  In that case, this file will be used as
       the main TeX file when generating a PDF directly from the template.
 
+    The line comments (starting with ``%%#``) at the beginning of the contents template
+    describe the template, and are shown by ``latex-templates list --long``.
+
 
     Besides the files provided directly by the project template, resources from external
     "libraries" may also be imported from the Jinja templates, and entire files may be referred
@@ -94,8 +161,19 @@ class ProjectTemplate:
     without any additional dependencies.
 
     These resources are searched for in the given *library path* for the project template.
+
+    The default configuration and the rendered contents template are cached per instance:
+    the former is reloaded only when ``default-conf.yaml`` changes, while the latter is
+    memoized for the most recently used configurations.  Instances may be shared
+    between threads, e.g. by the render server.
     """
 
+    MANIFEST_CACHE_SIZE = 32
+
+    # Build directories created by compile_pdf itself are never edited, so raw
+    # files may be shared with the template instead of being copied.
+    BUILD_COPY_STRATEGY = "hardlink"
+
     @classmethod
     def find(
         cls,
@@ -103,6 +181,7 @@ class ProjectTemplate:
         template_path: SearchPath = None,
         lib_path: SearchPath = None,
         verbose: bool = False,
+        bytecode_cache: Optional["jinja2.BytecodeCache"] = None,
     ) -> "ProjectTemplate":
         """
       Search for a named template in the file system.
@@ -121,6 +200,9 @@ class ProjectTemplate:
       :param verbose:
       If true, report attempts at finding the template.
 
+      :param bytecode_cache:
+      Optional Jinja bytecode cache used by the template's environment.
+
       :return:
       The
 
@@ -136,16 +218,22 @@ class ProjectTemplate:
             template_path = template_path or tpath
             lib_path = lib_path or lpath
 
-        for dir in template_path:
-            path = Path(dir) / name
-            if verbose:
-                print("  trying " + str(path), end="")
-            if cls.is_template(path):
+        with timing.span("find-template", name):
+            for dir in template_path:
+                path = Path(dir) / name
                 if verbose:
-                    print(" FOUND!")
-                return cls(path, lib_path)
-            elif verbose:
-                print()
+                    print("  trying " + str(path), end="")
+                index = registry.read_index(dir)
+                if index is None:
+                    found = cls.is_template(path)
+                else:
+                    found = name in index and cls.is_indexed_template(index[name])
+                if found:
+                    if verbose:
+                        print(" FOUND!")
+                    return cls(path, lib_path, bytecode_cache=bytecode_cache)
+                elif verbose:
+                    print()
 
         raise ProjectTemplateNotFoundError(name)
 
@@ -162,6 +250,13 @@ class ProjectTemplate:
             if verbose:
                 print(f"checking {dir}")
 
+            index = registry.read_index(dir)
+            if index is not None:
+                for name, record in index.items():
+                    if cls.is_indexed_template(record):
+                        yield name
+                continue
+
             for subdir in Path(dir).iterdir():
                 if cls.is_template(subdir):
                     yield subdir.name
@@ -175,10 +270,41 @@ class ProjectTemplate:
             and (directory / "contents.yaml").is_file()
         )
 
-    def __init__(self, root_dir: Union[str, Path], lib_path: SearchPath):
+    @classmethod
+    def is_indexed_template(cls, record: registry.TemplateRecord) -> bool:
+        """Check if a template recorded by an index still conforms to the conventions.
+
+        Only templates modified since the index was written are checked again.
+        """
+        return registry.is_current(record) or cls.is_template(record.path)
+
+    def __init__(
+        self,
+        root_dir: Union[str, Path],
+        lib_path: SearchPath,
+        bytecode_cache: Optional["jinja2.BytecodeCache"] = None,
+    ):
         self.__root_dir = Path(root_dir)
+        self.__lib_path = [Path(p) for p in lib_path]
+        self.__default_conf_file = self.__root_dir / "default-conf.yaml"
+        self.__contents_file = self.__root_dir / "contents.yaml"
+        self.__schema_file = self.__root_dir / "schema.yaml"
+
+        import jinja2
+
+        from .bundle import MODULES_DIR, BundleDependencies, read_bundle
+        from .deps import DependencyTracker
+
+        # Bundles contain their compiled templates, and need neither the
+        # libraries nor a bytecode cache
+        self.__bundle = read_bundle(self.__root_dir)
+        if self.__bundle is None:
+            paths = [root_dir] + list(lib_path)
+            loader = jinja2.FileSystemLoader([str(p) for p in paths])
+        else:
+            loader = jinja2.ModuleLoader(str(self.__root_dir / MODULES_DIR))
+            bytecode_cache = None
 
-        paths = [root_dir] + list(lib_path)
         self.__env = jinja2.Environment(
             block_start_string=r"\STMT{",
             block_end_string=r"}",
@@ -191,43 +317,387 @@ class ProjectTemplate:
             # trim_blocks = True,
             # lstrip_blocks = True,
             autoescape=False,
-            loader=jinja2.FileSystemLoader([str(p) for p in paths]),
+            loader=loader,
             keep_trailing_newline=True,
+            bytecode_cache=bytecode_cache,
         )
 
+        if self.__bundle is None:
+            self.__dependencies = DependencyTracker(self.__env)
+        else:
+            self.__dependencies = BundleDependencies(self.__bundle)
+        self.__default_conf: Optional[dict] = None
+        self.__frozen_default_conf: Mapping = MappingProxyType({})
+        self.__default_conf_signature: Optional[FileSignature] = None
+        self.__schema: Optional[Tuple[tuple, Schema]] = None
+        self.__manifest_cache: "OrderedDict[tuple, List[GeneratedFile]]" = OrderedDict()
+        self.__manifest_lock = threading.Lock()
+
     @property
     def name(self) -> str:
         return self.__root_dir.name
 
+    @property
+    def root_dir(self) -> Path:
+        return self.__root_dir
+
+    @property
+    def lib_path(self) -> SearchPath:
+        return list(self.__lib_path)
+
     @property
     def default_conf_file(self) -> Path:
-        return self.__root_dir / "default-conf.yaml"
+        return self.__default_conf_file
+
+    @property
+    def contents_file(self) -> Path:
+        return self.__contents_file
+
+    @property
+    def schema_file(self) -> Path:
+        return self.__schema_file
+
+    @property
+    def is_bundle(self) -> bool:
+        """Whether this template is a precompiled bundle (see ``compile_bundle``)."""
+        return self.__bundle is not None
+
+    def compile_bundle(
+        self, output_dir: Union[str, Path], verbose: bool = False
+    ) -> Path:
+        """Compile this template, with the library templates it uses, into a bundle.
+
+        The bundle is a template directory loading its templates from Python
+        modules, compiled from the file templates, instead of from their sources.
+        See ``latex_templates.bundle`` for details.
+
+        :param output_dir:
+        Directory where the bundle will be written, which must either not exist
+        or contain a previous bundle, which is replaced.
+
+        :param verbose:
+        If true, write the name of each compiled template to the standard output.
+
+        :return:
+        Path to the bundle.
+
+        :raise:
+        ValueError when this template is a bundle already, or the output directory
+        contains something else.
+        """
+        from .bundle import compile_bundle
+
+        if self.is_bundle:
+            raise ValueError(f"The template '{self.name}' is a bundle already.")
+        return compile_bundle(
+            self.name,
+            self.__root_dir,
+            self.__env,
+            self.__dependencies,
+            output_dir,
+            verbose,
+        )
 
     def load_default_conf(self) -> dict:
-        with open(str(self.default_conf_file)) as default_conf:
-            return yaml.full_load(default_conf)
+        return copy.deepcopy(self.__cached_default_conf())
+
+    def __cached_default_conf(self) -> dict:
+        signature = file_signature(self.default_conf_file)
+        if self.__default_conf is None or signature != self.__default_conf_signature:
+            with timing.span("load-default-conf", self.name), open(
+                str(self.default_conf_file)
+            ) as default_conf:
+                self.__default_conf = load_yaml(default_conf) or {}
+            self.__frozen_default_conf = freeze(self.__default_conf)
+            self.__default_conf_signature = signature
+        return self.__default_conf
+
+    def load_schema(self) -> Schema:
+        """Compile the schema of this template, from its schema file or else from its defaults.
+
+        The compiled schema is cached until either file changes.
+        """
+        self.__cached_default_conf()
+        return self.__compiled_schema()
+
+    def __compiled_schema(self) -> Schema:
+        """The schema for the currently cached defaults, compiled again only if a file changed."""
+        key = (file_signature(self.schema_file), self.__default_conf_signature)
+        cached = self.__schema
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        if key[0] is not None:
+            schema = Schema.load(self.schema_file)
+        else:
+            schema = Schema.from_defaults(self.__frozen_default_conf)
+        self.__schema = (key, schema)
+        return schema
 
-    def generate(self, config: dict, target_dir: Union[str, Path]):
-        config = self.__config_with_defaults(config)
-        env = self.__env
+    def validate(self, config: dict, source: Optional[str] = None):
+        """Check a config, merged with the defaults, against the schema of this template.
 
-        target_dir = Path(target_dir)
-        if not target_dir.exists():
-            target_dir.mkdir(parents=True)
+        :param source:
+        Optional description of the config (e.g. its file name) for the error message.
 
-        for entry in self.get_generated_files(config):
-            out_path = target_dir / entry.tgt
-            if not out_path.parent.exists():
-                out_path.parent.mkdir(parents=True)
+        :raise:
+        InvalidConfigError describing every violation of the schema.
+        """
+        self.__config_with_defaults(config, source)
 
-            if entry.is_raw:
-                in_path = self.__root_dir / entry.src
-                shutil.copyfile(in_path, out_path)
+    def validate_batch(
+        self, configs: Iterable[dict], target_dir_pattern: Optional[str] = None
+    ) -> List[InvalidConfigError]:
+        """Validate every config of a batch, without rendering any project.
+
+        :param target_dir_pattern:
+        Optional pattern for the directory of each project, as in ``generate_many``,
+        in which case configs sharing a directory with a previous one are invalid.
+
+        :return:
+        The errors of the invalid configs, in the order of the batch.
+        """
+        errors: List[InvalidConfigError] = []
+        for _ in self.__iter_batch(configs, target_dir_pattern, errors.append):
+            pass
+        return errors
+
+    def generate(
+        self,
+        config: dict,
+        target: Union[str, Path, OutputSink],
+        *,
+        only_changed: bool = True,
+        workers: Optional[int] = None,
+        copy_strategy: str = "copy",
+    ) -> GenerationReport:
+        """Generate a project from this template in the given directory or output sink.
+
+        Files generated by a previous call that are no longer part of the project
+        are removed, unless they were modified in the meantime.
+
+        :param config:
+        Configuration dictionary for the project template.
 
+        :param target:
+        Directory where the project will be generated, created if necessary.
+        Alternatively, an ``OutputSink`` receiving the generated files, e.g. a
+        ``MemorySink`` or an ``ArchiveSink``.
+
+        :param only_changed:
+        If true, files whose contents would not change are not written, so
+        that their modification times are preserved.  Moreover, files whose
+        inputs (template sources and referenced config entries) did not change
+        since the previous generation are not even rendered.  Only used when
+        ``target`` is a directory.
+
+        :param workers:
+        Optional number of threads rendering and writing files concurrently,
+        which mostly pays off for projects with many files on slow (e.g.
+        network) filesystems.  Sinks that are not ``concurrent`` are always
+        used serially.  If several files fail, the error of the first one in
+        the contents template is raised.
+
+        :param copy_strategy:
+        How raw files are placed into the target directory: ``copy``,
+        ``hardlink``, ``reflink`` or ``symlink``, falling back to copying when
+        the strategy is not supported.  Links share the file with the template,
+        so they are only safe if the generated files are not edited in place.
+
+        :return:
+        Report of which files were written, skipped or removed.
+
+        :raise:
+        InvalidConfigError when the config does not conform to the template's schema,
+        or places files outside of the project, before anything is written.
+        """
+        config = self.__config_with_defaults(config)
+        # Rendering the contents rejects invalid target paths, before the sink
+        # creates the target directory
+        entries = self.__generated_files(config)
+        if isinstance(target, OutputSink):
+            sink = target
+        else:
+            sink = DiskSink(target, only_changed, copy_strategy)
+
+        if workers is not None and workers > 1 and sink.concurrent and len(entries) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(workers, thread_name_prefix="generate") as executor:
+                futures = [
+                    executor.submit(self.__generate_file, sink, entry, config)
+                    for entry in entries
+                ]
+                try:
+                    outcomes = [future.result() for future in futures]
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        else:
+            outcomes = [self.__generate_file(sink, entry, config) for entry in entries]
+
+        report = GenerationReport([], [], [])
+        for entry, written in zip(entries, outcomes):
+            (report.written if written else report.skipped).append(entry.tgt)
+        report.removed.extend(sink.finish())
+        return report
+
+    def __generate_file(
+        self, sink: OutputSink, entry: GeneratedFile, config: dict
+    ) -> bool:
+        """Hand a single file of the project to the sink, returning whether it was written."""
+        in_path = self.__root_dir / entry.src
+        inputs = {}
+        if sink.incremental:
+            if entry.is_raw:
+                fingerprint = json.dumps(file_signature(in_path))
             else:
-                template = env.get_template(str(entry.src))
-                with open(out_path, "w") as out:
-                    template.stream(config).dump(out)
+                fingerprint = self.__dependencies.fingerprint(str(entry.src), config)
+            inputs = {
+                "src": entry.src.as_posix(),
+                "raw": entry.is_raw,
+                "fingerprint": fingerprint,
+            }
+            if sink.keep(entry.tgt, inputs):
+                return False
+
+        if entry.is_raw:
+            with timing.span("copy", entry.tgt):
+                return sink.copy(entry.tgt, in_path, inputs)
+        with timing.span("render", entry.tgt):
+            template = self.__env.get_template(str(entry.src))
+            return sink.write(entry.tgt, template.generate(config), inputs)
+
+    def generate_to_archive(
+        self, config: dict, fileobj: Union[str, Path, BinaryIO], format: str = "zip"
+    ) -> List[Path]:
+        """Generate a project directly into an archive, without writing it to disk.
+
+        Rendered templates are streamed into the archive as they are produced,
+        and raw files are copied from the template.
+
+        :param config:
+        Configuration dictionary for the project template.
+
+        :param fileobj:
+        Path of the archive, or a binary file object (which need not be seekable)
+        the archive will be written to.
+
+        :param format:
+        Either ``"zip"``, ``"tar"`` or ``"tar.gz"``.
+
+        :return:
+        Paths of the generated files, relative to the root of the archive.
+
+        :raise:
+        InvalidConfigError when the config does not conform to the template's
+        schema, before the archive is created.  If the generation fails later on,
+        an archive given by its path is removed.
+        """
+        config = self.__config_with_defaults(config)
+        # Render the contents template first, which rejects invalid target paths
+        self.__generated_files(config)
+        if not isinstance(fileobj, (str, Path)):
+            sink = ArchiveSink(fileobj, format)
+            try:
+                return self.generate(config, sink).written
+            finally:
+                sink.close()
+
+        path = Path(fileobj)
+        with open(str(path), "wb") as archive_file:
+            try:
+                return self.generate_to_archive(config, archive_file, format)
+            except BaseException:
+                archive_file.close()
+                path.unlink()
+                raise
+
+    async def agenerate(
+        self,
+        config: dict,
+        target: Union[str, Path, OutputSink],
+        *,
+        only_changed: bool = True,
+        workers: Optional[int] = None,
+        copy_strategy: str = "copy",
+    ) -> GenerationReport:
+        """Generate a project like ``generate``, without blocking the event loop.
+
+        Rendering and writing the files runs in the default executor of the loop.
+        Since the thread cannot be interrupted, cancelling the calling task only
+        takes effect once the generation finished, so that the caller may safely
+        remove the target directory.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        generation = loop.run_in_executor(
+            None,
+            functools.partial(
+                self.generate,
+                config,
+                target,
+                only_changed=only_changed,
+                workers=workers,
+                copy_strategy=copy_strategy,
+            ),
+        )
+        try:
+            return await asyncio.shield(generation)
+        except asyncio.CancelledError:
+            await asyncio.wait([generation])
+            raise
+
+    def generate_many(
+        self, configs: Iterable[dict], target_dir_pattern: str
+    ) -> List[Path]:
+        """Generate one project for each of the given configurations.
+
+        All projects share this template's Jinja environment, so each file template
+        is compiled only once for the whole batch.
+
+        :param configs:
+        Configuration dictionaries for the project template.  If they are given
+        as a sequence (e.g. a list), all of them are validated before the first
+        project is generated; other iterables are validated as they are read
+        (see ``validate_batch`` for checking them beforehand).
+
+        :param target_dir_pattern:
+        Jinja template (e.g. ``out/\\EXPR{ name }``) for the directory of each
+        project, rendered with the config merged with its defaults.  The position
+        of the config in the batch is available as ``index``.
+
+        :return:
+        Paths to the generated projects, in the order of the given configs.
+
+        :raise:
+        InvalidConfigError when a config does not conform to the schema, or would
+        be generated into the same directory as a previous one.
+        """
+        target_dirs = []
+        for config, target_dir in self.iter_batch(configs, target_dir_pattern):
+            self.generate(config, target_dir)
+            target_dirs.append(target_dir)
+        return target_dirs
+
+    def iter_batch(
+        self,
+        configs: Iterable[dict],
+        target_dir_pattern: str,
+        on_invalid: Optional[Callable[[InvalidConfigError], None]] = None,
+    ) -> Iterable[Tuple[dict, Path]]:
+        """Lazily pair each config of a batch, merged with the defaults, with its target directory.
+
+        See ``generate_many`` for a description of the parameters.
+
+        :param on_invalid:
+        Optional callback receiving the error of each invalid config, which is
+        then skipped (as soon as it is read) instead of stopping the batch.
+        """
+        batch = self.__merge_batch(configs, target_dir_pattern, on_invalid)
+        for _, config, target_dir in batch:
+            yield config, target_dir
 
     def compile_pdf(
         self,
@@ -237,6 +707,9 @@ class ProjectTemplate:
         build_dir: Union[str, Path, None] = None,
         overwrite: bool = False,
         verbose: bool = False,
+        timeout: Optional[float] = None,
+        pdf_cache: Optional[cache.PdfCache] = None,
+        build_pool: Optional[BuildDirPool] = None,
     ) -> Path:
         """Generate the given project template and compile the resulting PDF.
 
@@ -254,7 +727,8 @@ class ProjectTemplate:
 
         :param build_dir:
         Optional path where the project will be generated.
-        If omitted, a temporary directory will be used and deleted as soon as
+        If omitted, a directory from ``build_pool`` is used or, if no pool is
+        given, a temporary directory will be used and deleted as soon as
         compilation completes.
 
         :param overwrite:
@@ -264,22 +738,61 @@ class ProjectTemplate:
         :param verbose:
         If true, write the compilation progress to the standard output.
 
+        :param timeout:
+        Optional number of seconds after which latexmk is aborted.
+
+        :param pdf_cache:
+        Optional cache of compiled PDFs, consulted only when ``build_dir`` is
+        omitted.  On a hit, LaTeX is not invoked at all.
+
+        :param build_pool:
+        Optional pool of persistent build directories, used when ``build_dir`` is
+        omitted so that latexmk may reuse the results of previous compilations.
+
         :return:
         Path to the generateed file.
 
         :raise:
-        ValueError when the template does not specify a main file.
+        ValueError when the template does not specify a main file, or a
+        ``BuildError`` when latexmk fails or times out.
         """
         output_path = None if output_path is None else Path(output_path)
-        if build_dir is None:
-            with TemporaryDirectory() as build_dir:
+        if build_dir is not None:
+            return self.__compile_pdf(
+                config,
+                output_path,
+                Path(build_dir),
+                overwrite,
+                verbose,
+                timeout,
+                None,
+                "copy",
+            )
+        elif build_pool is not None:
+            identity = config_identity(self.__config_with_defaults(config))
+            with build_pool.acquire(self.name, identity) as build_dir:
                 return self.__compile_pdf(
-                    config, output_path, Path(build_dir), overwrite, verbose
+                    config,
+                    output_path,
+                    build_dir,
+                    overwrite,
+                    verbose,
+                    timeout,
+                    pdf_cache,
+                    self.BUILD_COPY_STRATEGY,
                 )
         else:
-            return self.__compile_pdf(
-                config, output_path, Path(build_dir), overwrite, verbose
-            )
+            with TemporaryDirectory() as build_dir:
+                return self.__compile_pdf(
+                    config,
+                    output_path,
+                    Path(build_dir),
+                    overwrite,
+                    verbose,
+                    timeout,
+                    pdf_cache,
+                    self.BUILD_COPY_STRATEGY,
+                )
 
     def __compile_pdf(
         self,
@@ -288,40 +801,448 @@ class ProjectTemplate:
         build_dir: Path,
         overwrite: bool,
         verbose: bool,
+        timeout: Optional[float],
+        pdf_cache: Optional[cache.PdfCache],
+        copy_strategy: str,
     ) -> Path:
-        self.generate(config, build_dir)
+        config = self.__config_with_defaults(config)
+        main_file = self.__require_main_file(config)
+        self.generate(config, build_dir, copy_strategy=copy_strategy)
 
-        main_file = self.get_main_latex_file(config)
-        if main_file is None:
-            raise ValueError(f"Template '{self.name}' does not specify a main file.")
+        cache_key = self.__pdf_cache_key(pdf_cache, config, build_dir)
+        if cache_key is not None:
+            generated_file = pdf_cache.lookup(cache_key)
+            if generated_file is not None:
+                if verbose:
+                    print(f"Using cached PDF for {main_file.tgt}")
+                if output_path is not None:
+                    return self.__copy_output(
+                        generated_file, output_path, main_file.tgt, overwrite
+                    )
+                return generated_file
 
         if verbose:
             print(f"Building from {main_file.tgt}")
-        subprocess.run(
-            ["latexmk", "-pdf", main_file.tgt],
-            cwd=str(build_dir),
-            stdout=sys.stdout if verbose else subprocess.DEVNULL,
-            stderr=sys.stderr if verbose else subprocess.DEVNULL,
-        )
+        result = run_latexmk(build_dir, main_file.tgt, timeout=timeout, stream=verbose)
+        if not result.ok:
+            # A persistent build directory may still contain the PDF of a previous build
+            raise BuildError(result)
+
+        generated_file = result.generated_pdf
+        if cache_key is not None and generated_file.is_file():
+            generated_file = pdf_cache.store(
+                cache_key, generated_file, build_dir, main_file.tgt
+            )
 
-        generated_file = (build_dir / main_file.tgt).with_suffix(".pdf")
         if output_path is not None:
-            if output_path.is_dir():
-                output_path = (output_path / main_file.tgt).with_suffix(".pdf")
-            output_file, i = output_path, 1
-            while output_file.exists() and not overwrite:
-                output_file = output_path.parent / f"{output_path.stem} ({i}).pdf"
-                i += 1
-            shutil.copyfile(str(generated_file), str(output_file))
-            return output_file
+            return self.__copy_output(
+                generated_file, output_path, main_file.tgt, overwrite
+            )
         else:
             return generated_file
 
+    async def acompile_pdf(
+        self,
+        config: dict,
+        *,
+        output_path: Union[str, Path, None] = None,
+        build_dir: Union[str, Path, None] = None,
+        overwrite: bool = False,
+        timeout: Optional[float] = None,
+        semaphore: Optional["asyncio.Semaphore"] = None,
+        on_output: Optional[Callable[[str], None]] = None,
+        pdf_cache: Optional[cache.PdfCache] = None,
+        build_pool: Optional[BuildDirPool] = None,
+    ) -> BuildResult:
+        """Generate the given project template and compile it, without blocking the event loop.
+
+        The parameters ``config``, ``output_path``, ``build_dir``, ``overwrite``,
+        ``pdf_cache`` and ``build_pool`` are as in ``compile_pdf``.  If the
+        calling task is cancelled, the latexmk process tree is killed.
+
+        :param timeout:
+        Optional number of seconds after which latexmk is aborted.
+
+        :param semaphore:
+        Optional semaphore shared by concurrent calls, bounding how many projects
+        are generated and compiled at once.
+
+        :param on_output:
+        Optional callback receiving the output of latexmk as it is produced.
+
+        :return:
+        The result of the build, whose ``pdf`` is the path to the generated file,
+        or None when the build failed or the file was not kept.
+
+        :raise:
+        ValueError when the template does not specify a main file.
+        """
+        output_path = None if output_path is None else Path(output_path)
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            with ExitStack() as stack:
+                keep_build_dir = build_dir is not None or build_pool is not None
+                copy_strategy = self.BUILD_COPY_STRATEGY
+                if build_dir is not None:
+                    build_dir, pdf_cache = Path(build_dir), None
+                    copy_strategy = "copy"
+                elif build_pool is not None:
+                    identity = config_identity(self.__config_with_defaults(config))
+                    build_dir = stack.enter_context(
+                        build_pool.acquire(self.name, identity)
+                    )
+                else:
+                    build_dir = Path(stack.enter_context(TemporaryDirectory()))
+
+                result = await self.__acompile_pdf(
+                    config, build_dir, timeout, on_output, pdf_cache, copy_strategy
+                )
+                if result.ok and output_path is not None:
+                    pdf = self.__copy_output(
+                        result.pdf, output_path, result.main_file, overwrite
+                    )
+                elif result.ok and (keep_build_dir or pdf_cache is not None):
+                    pdf = result.pdf
+                else:
+                    pdf = None
+                return result._replace(pdf=pdf)
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    async def __acompile_pdf(
+        self,
+        config: dict,
+        build_dir: Path,
+        timeout: Optional[float],
+        on_output: Optional[Callable[[str], None]],
+        pdf_cache: Optional[cache.PdfCache],
+        copy_strategy: str,
+    ) -> BuildResult:
+        config = self.__config_with_defaults(config)
+        main_file = self.__require_main_file(config)
+        await self.agenerate(config, build_dir, copy_strategy=copy_strategy)
+
+        cache_key = self.__pdf_cache_key(pdf_cache, config, build_dir)
+        if cache_key is not None:
+            generated_file = pdf_cache.lookup(cache_key)
+            if generated_file is not None:
+                return BuildResult(
+                    build_dir, main_file.tgt, 0, None, pdf=generated_file, cached=True
+                )
+
+        result = await arun_latexmk(
+            build_dir, main_file.tgt, timeout=timeout, on_output=on_output
+        )
+        generated_file = result.generated_pdf
+        if cache_key is not None and result.ok and generated_file.is_file():
+            generated_file = pdf_cache.store(
+                cache_key, generated_file, build_dir, main_file.tgt
+            )
+        return result._replace(pdf=generated_file)
+
+    def compile_pdf_many(
+        self,
+        configs: Iterable[dict],
+        *,
+        output_dir: Union[str, Path, None] = None,
+        build_dir_pattern: Optional[str] = None,
+        overwrite: bool = False,
+        jobs: Optional[int] = None,
+        timeout: Optional[float] = None,
+        verbose: bool = False,
+        pdf_cache: Optional[cache.PdfCache] = None,
+        build_pool: Optional[BuildDirPool] = None,
+        only_changed: bool = True,
+        workers: Optional[int] = None,
+        copy_strategy: Optional[str] = None,
+        on_invalid: Optional[Callable[[InvalidConfigError], None]] = None,
+    ) -> List[BuildResult]:
+        """Generate and compile one project for each of the given configurations.
+
+        Projects are generated one at a time, but up to ``jobs`` latexmk processes
+        run concurrently.  Failed builds do not interrupt the others, instead they
+        are reported in the results.
+
+        :param configs:
+        Configuration dictionaries for the project template, validated as in
+        ``generate_many``.
+
+        :param output_dir:
+        Optional directory where the PDFs will be copied, named after the main
+        TeX file of each project.
+
+        :param build_dir_pattern:
+        Optional Jinja template for the directory where each project will be
+        generated, as in ``generate_many``.  If omitted, directories from
+        ``build_pool`` or temporary directories are used.
+
+        :param overwrite:
+        If false, add a suffix to the output filenames to avoid overwriting
+        existing files.
+
+        :param jobs:
+        Maximum number of concurrent latexmk processes, by default the number of CPUs.
+
+        :param timeout:
+        Optional number of seconds after which each compilation is aborted.
+
+        :param verbose:
+        If true, write the log of each compilation to the standard output.
+
+        :param pdf_cache:
+        Optional cache of compiled PDFs, consulted only when ``build_dir_pattern``
+        is omitted.  Cached projects are not compiled again.
+
+        :param build_pool:
+        Optional pool of persistent build directories, used when
+        ``build_dir_pattern`` is omitted.
+
+        :param only_changed:
+        Passed on to ``generate`` for each project.
+
+        :param workers:
+        Passed on to ``generate`` for each project.
+
+        :param copy_strategy:
+        How raw files are placed into the build directories, as in ``generate``.
+        By default, they are copied into the directories given by
+        ``build_dir_pattern``, and hard-linked into those managed by this method.
+
+        :param on_invalid:
+        Optional callback receiving the error of each invalid config, which is
+        then skipped instead of stopping the batch, as in ``iter_batch``.
+
+        :return:
+        One result for each (valid) config, in the same order, whose ``pdf`` is
+        the path to the generated file, or None when it was not kept.
+
+        :raise:
+        ValueError when the template does not specify a main file.
+        """
+        from concurrent.futures import Future
+
+        results = []
+        keep_build_dirs = build_dir_pattern is not None
+        if keep_build_dirs:
+            pdf_cache = None
+        if copy_strategy is None:
+            copy_strategy = "copy" if keep_build_dirs else self.BUILD_COPY_STRATEGY
+
+        def finish(cache_key, build, release):
+            result = build.result()
+            if verbose:
+                state = "Cached" if result.cached else "Built"
+                print(f"{state} {result.build_dir / result.main_file}")
+                if result.log is not None:
+                    print(result.log)
+
+            generated_file = result.pdf if result.cached else result.generated_pdf
+            if not result.cached and cache_key is not None and result.ok:
+                generated_file = pdf_cache.store(
+                    cache_key, generated_file, result.build_dir, result.main_file
+                )
+
+            pdf = None
+            if result.ok and output_dir is not None:
+                pdf = self.__copy_output(
+                    generated_file, Path(output_dir), result.main_file, overwrite
+                )
+            elif result.ok and (keep_build_dirs or build_pool or pdf_cache):
+                pdf = generated_file
+            release.close()
+            results.append(result._replace(pdf=pdf))
+
+        with ExitStack() as stack:
+            if keep_build_dirs:
+                batch = self.iter_batch(configs, build_dir_pattern, on_invalid)
+            else:
+                tmp_dir = Path(stack.enter_context(TemporaryDirectory()))
+                batch = (
+                    (config, tmp_dir / str(index))
+                    for index, config, _ in self.__merge_batch(
+                        configs, None, on_invalid
+                    )
+                )
+            pending = stack.enter_context(ExitStack())
+            scheduler = stack.enter_context(BuildScheduler(jobs, timeout=timeout))
+
+            builds = deque()
+            for config, build_dir in batch:
+                main_file = self.__require_main_file(config)
+                release = pending.enter_context(ExitStack())
+                if build_pool is not None and not keep_build_dirs:
+                    build_dir = release.enter_context(
+                        build_pool.acquire(self.name, config_identity(config))
+                    )
+                self.generate(
+                    config,
+                    build_dir,
+                    only_changed=only_changed,
+                    workers=workers,
+                    copy_strategy=copy_strategy,
+                )
+
+                cache_key = self.__pdf_cache_key(pdf_cache, config, build_dir)
+                cached_pdf = None if cache_key is None else pdf_cache.lookup(cache_key)
+                if cached_pdf is not None:
+                    build = Future()
+                    build.set_result(
+                        BuildResult(
+                            build_dir,
+                            main_file.tgt,
+                            0,
+                            None,
+                            pdf=cached_pdf,
+                            cached=True,
+                        )
+                    )
+                else:
+                    build = scheduler.submit(build_dir, main_file.tgt)
+                builds.append((cache_key, build, release))
+
+                while builds and builds[0][1].done():
+                    finish(*builds.popleft())
+
+            while builds:
+                finish(*builds.popleft())
+        return results
+
+    def __merge_batch(
+        self,
+        configs: Iterable[dict],
+        target_dir_pattern: Optional[str],
+        on_invalid: Optional[Callable[[InvalidConfigError], None]] = None,
+    ) -> Iterable[Tuple[int, ConfigView, Optional[Path]]]:
+        """Validate a batch like ``__iter_batch``.
+
+        Unless invalid configs are skipped, sequences are validated entirely
+        before the first config is returned, so that nothing is generated from
+        an invalid batch.  Other iterables, which might not fit into memory,
+        are validated lazily.
+        """
+        batch = self.__iter_batch(configs, target_dir_pattern, on_invalid)
+        if on_invalid is None and isinstance(configs, Sequence):
+            return list(batch)
+        return batch
+
+    def __iter_batch(
+        self,
+        configs: Iterable[dict],
+        target_dir_pattern: Optional[str],
+        on_invalid: Optional[Callable[[InvalidConfigError], None]],
+    ) -> Iterator[Tuple[int, ConfigView, Optional[Path]]]:
+        """Merge each config of a batch with the defaults, validate it and render its target directory.
+
+        Yields the index of each valid config in the batch, the merged config
+        and its target directory (None without a pattern).  Configs that do
+        not conform to the schema, or share their target directory with a
+        previous config, are passed to ``on_invalid`` and skipped, or raise an
+        ``InvalidConfigError`` if it is None.
+        """
+        pattern = None
+        if target_dir_pattern is not None:
+            pattern = self.__env.from_string(target_dir_pattern)
+        seen = {}
+
+        for index, config in enumerate(configs):
+            source = f"#{index} of the batch"
+            try:
+                config = self.__config_with_defaults(config, source)
+                target_dir = None
+                if pattern is not None:
+                    target_dir = Path(pattern.render(config, index=index))
+                    if target_dir in seen:
+                        raise InvalidConfigError(
+                            [
+                                f"target directory '{target_dir}' is already used "
+                                f"by #{seen[target_dir]} of the batch"
+                            ],
+                            source,
+                        )
+                    seen[target_dir] = index
+            except InvalidConfigError as e:
+                if on_invalid is None:
+                    raise
+                on_invalid(e)
+                continue
+            yield index, config, target_dir
+
+    def __pdf_cache_key(
+        self, pdf_cache: Optional[cache.PdfCache], config: dict, build_dir: Path
+    ) -> Optional[str]:
+        """Compute the key of a generated project in the PDF cache, considering only generated files."""
+        if pdf_cache is None:
+            return None
+        main_file = self.__require_main_file(config)
+        files = [entry.tgt for entry in self.__generated_files(config)]
+        return pdf_cache.key(build_dir, latexmk_command(main_file.tgt), files)
+
+    def __require_main_file(self, config: dict) -> GeneratedFile:
+        main_file = self.get_main_latex_file(config)
+        if main_file is None:
+            raise ValueError(f"Template '{self.name}' does not specify a main file.")
+        return main_file
+
+    @staticmethod
+    def __copy_output(
+        generated_file: Path, output_path: Path, main_file: Path, overwrite: bool
+    ) -> Path:
+        if output_path.is_dir():
+            output_path = (output_path / main_file).with_suffix(".pdf")
+        output_file, i = output_path, 1
+        while output_file.exists() and not overwrite:
+            output_file = output_path.parent / f"{output_path.stem} ({i}).pdf"
+            i += 1
+        shutil.copyfile(str(generated_file), str(output_file))
+        return output_file
+
     def get_generated_files(self, config: dict) -> List[GeneratedFile]:
         """Obtain a list of files that should be generated with the given config."""
-        config = self.__config_with_defaults(config)
-        file_list = self.__env.get_template("contents.yaml").render(config)
-        return [GeneratedFile.from_yaml(entry) for entry in yaml.full_load(file_list)]
+        return list(self.__generated_files(self.__config_with_defaults(config)))
+
+    def __generated_files(self, config: ConfigView) -> List[GeneratedFile]:
+        """Render the contents template for an already merged config, memoizing the result.
+
+        The result is keyed on the config without its defaults, which are
+        identified by the signature of the default config file instead.
+
+        :raise:
+        InvalidConfigError when the target path of a file is absolute or leads
+        outside of the project.
+        """
+        digest = config_digest(config.config)
+        key = (
+            file_signature(self.contents_file),
+            self.__default_conf_signature,
+            digest,
+        )
+        with self.__manifest_lock:
+            if digest is not None and key in self.__manifest_cache:
+                self.__manifest_cache.move_to_end(key)
+                return self.__manifest_cache[key]
+
+        with timing.span("render-contents", self.name):
+            file_list = self.__env.get_template("contents.yaml").render(config)
+            files = [GeneratedFile.from_yaml(entry) for entry in load_yaml(file_list)]
+
+        # Targets may be built from config values, which must not place files
+        # outside of the project (e.g. a name like "../../etc/x")
+        errors = [
+            f"contents: target '{entry.tgt}' is not a relative path inside the project"
+            for entry in files
+            if entry.tgt.is_absolute() or ".." in entry.tgt.parts or entry.tgt == Path()
+        ]
+        if errors:
+            raise InvalidConfigError(errors)
+
+        if digest is not None:
+            with self.__manifest_lock:
+                self.__manifest_cache[key] = files
+                while len(self.__manifest_cache) > self.MANIFEST_CACHE_SIZE:
+                    self.__manifest_cache.popitem(last=False)
+        return files
 
     def get_main_latex_file(self, config: dict) -> Optional[GeneratedFile]:
         """Obtain the main LaTeX file that may be used to compile a PDF, if there is one."""
@@ -330,12 +1251,112 @@ class ProjectTemplate:
                 return entry
         return None
 
-    def __config_with_defaults(self, config: dict) -> dict:
-        return {**self.load_default_conf(), **config}
+    def __config_with_defaults(
+        self, config: dict, source: Optional[str] = None
+    ) -> ConfigView:
+        """Overlay a config on the defaults, sharing the frozen default tree between all configs.
+
+        The merged config is validated against the schema, unless it was already
+        merged (and thus validated) by this template.
+        """
+        if (
+            isinstance(config, ConfigView)
+            and config.defaults is self.__frozen_default_conf
+        ):
+            return config
+        self.__cached_default_conf()
+        config = ConfigView(config, self.__frozen_default_conf)
+        with timing.span("validate", self.name):
+            self.__compiled_schema().validate(config, source)
+        return config
+
+
+def enumerate_templates(
+    template_path: SearchPath, verbose: bool = False, cache_dir: Optional[Path] = None
+):
+    """Enumerate the names of all available templates.
+
+    If ``cache_dir`` is given, the templates found in each directory of the path
+    are cached, and the directory is only scanned again after it is modified.
+    """
+    if cache_dir is None or verbose:
+        yield from ProjectTemplate.find_all(template_path, verbose)
+    else:
+        yield from cache.cached_template_names(
+            template_path,
+            lambda directory: list(ProjectTemplate.find_all([directory])),
+            cache_dir / cache.TEMPLATE_INDEX_FILE,
+        )
+
 
-def enumerate_templates(template_path: SearchPath, verbose: bool = False):
-    for template in ProjectTemplate.find_all(template_path, verbose):
-        yield template
+def describe_templates(template_path: SearchPath) -> Iterable[Tuple[str, Path, str]]:
+    """Enumerate the name, path and description of all available templates, using indices when possible."""
+    for directory in template_path:
+        index = registry.read_index(directory)
+        if index is not None:
+            for record in index.values():
+                if ProjectTemplate.is_indexed_template(record):
+                    yield record.name, record.path, record.description
+        elif directory.is_dir():
+            for name in ProjectTemplate.find_all([directory]):
+                path = directory / name
+                yield name, path, registry.read_description(path / "contents.yaml")
+
+
+def user_template_dirs(template_path: SearchPath) -> SearchPath:
+    """Select the directories of the template path that are owned by the current user.
+
+    The templates bundled with this package are never included, so that
+    indexing does not write into the installed package.
+    """
+    package_templates = Path(__file__).resolve().parent / "templates"
+    getuid = getattr(os, "getuid", None)
+    directories = []
+    for directory in template_path:
+        try:
+            owner = directory.stat().st_uid
+        except OSError:
+            continue
+        if directory.resolve() == package_templates:
+            continue
+        if getuid is None or owner == getuid():
+            directories.append(directory)
+    return directories
+
+
+def reindex_templates(
+    directories: Iterable[Path], lib_path: SearchPath, verbose: bool = False
+):
+    for directory in directories:
+        if not directory.is_dir():
+            continue
+        records = registry.build_index(directory, lib_path)
+        try:
+            registry.write_index(directory, records)
+        except OSError as e:
+            print(f"Could not write index of {directory}: {e}", file=sys.stderr)
+            continue
+        if verbose or records:
+            print(f"Indexed {len(records)} templates in {directory}")
+
+
+def generate_archive(
+    template: ProjectTemplate, config: dict, output_file: str, build: bool = False
+):
+    from .archive import archive_format
+
+    if build:
+        print("Archives cannot be built with latexmk.", file=sys.stderr)
+        sys.exit(1)
+    if output_file == "-":
+        template.generate_to_archive(config, sys.stdout.buffer, "zip")
+        return
+    try:
+        format = archive_format(output_file)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    template.generate_to_archive(config, output_file, format)
 
 
 def generate_config(template: ProjectTemplate, output_file: Union[str, Path]):
@@ -363,11 +1384,75 @@ def generate_project(
 
         if verbose:
             print(f"Building from {main_file.tgt}")
+        import subprocess
+
         subprocess.run(["latexmk", "-pdf", main_file.tgt], cwd=output_dir)
 
         return (Path(output_dir) / main_file.tgt).with_suffix(".pdf")
 
 
+def open_bytecode_cache(
+    cache_dir: Optional[Path], verbose: bool = False
+) -> Optional["jinja2.BytecodeCache"]:
+    if cache_dir is None:
+        return None
+    from .bccache import SizeBoundedBytecodeCache
+
+    try:
+        return SizeBoundedBytecodeCache(cache_dir / cache.BYTECODE_SUBDIR)
+    except OSError as e:
+        if verbose:
+            print(f"Bytecode cache disabled: {e}", file=sys.stderr)
+        return None
+
+
+def open_pdf_cache(
+    cache_dir: Optional[Path], verbose: bool = False
+) -> Optional[cache.PdfCache]:
+    if cache_dir is None:
+        return None
+    try:
+        return cache.PdfCache(cache_dir / cache.PDF_SUBDIR)
+    except OSError as e:
+        if verbose:
+            print(f"PDF cache disabled: {e}", file=sys.stderr)
+        return None
+
+
+def open_build_pool(
+    cache_dir: Optional[Path], verbose: bool = False
+) -> Optional[BuildDirPool]:
+    if cache_dir is None:
+        return None
+    try:
+        pool = BuildDirPool(cache_dir / BUILDS_SUBDIR)
+        pool.cleanup()
+        return pool
+    except OSError as e:
+        if verbose:
+            print(f"Persistent build directories disabled: {e}", file=sys.stderr)
+        return None
+
+
+def manage_cache(cache_dir: Path, clear: bool, max_age: Optional[float] = None):
+    subdirs = [cache.BYTECODE_SUBDIR, cache.PDF_SUBDIR, BUILDS_SUBDIR]
+    if clear:
+        for subdir in subdirs:
+            cache.clear_directory(cache_dir / subdir)
+        try:
+            (cache_dir / cache.TEMPLATE_INDEX_FILE).unlink()
+        except OSError:
+            pass
+    elif max_age is not None and (cache_dir / BUILDS_SUBDIR).is_dir():
+        removed = BuildDirPool(cache_dir / BUILDS_SUBDIR).cleanup(max_age)
+        print(f"Removed {removed} build directories")
+
+    print(f"Cache directory: {cache_dir}")
+    for subdir in subdirs:
+        info = cache.directory_info(cache_dir / subdir)
+        print(f"  {subdir}: {info.entries} entries, {info.total_bytes} bytes")
+
+
 DEFAULT_PATH = [
     "./",
     "{HOME}/.local/share/latex-templates/".format(HOME=Path.home()),
@@ -392,17 +1477,169 @@ def search_paths() -> Tuple[SearchPath, SearchPath]:
     template_path = [Path(p) / "templates" for p in path]
     lib_path = [Path(p) / "libraries" for p in path]
 
-    template_path.append(Path(pkg_resources.resource_filename(__name__, "templates")))
-    lib_path.append(Path(pkg_resources.resource_filename(__name__, "libraries")))
+    package_dir = Path(__file__).resolve().parent
+    template_path.append(package_dir / "templates")
+    lib_path.append(package_dir / "libraries")
 
     return template_path, lib_path
 
 
-def parse_args(template_path=None):
-    templates = (
-        list(enumerate_templates(template_path)) if template_path is not None else None
+def add_rewrite_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--rewrite",
+        action="store_true",
+        help="Write all generated files, even those whose contents did not change.",
     )
 
+
+def check_batch(
+    template: ProjectTemplate, configs: Iterable[dict], target_dir_pattern: str
+) -> bool:
+    """Validate each config of a batch, printing the errors, and return whether all are valid."""
+    errors = template.validate_batch(configs, target_dir_pattern)
+    for error in errors:
+        print(error, file=sys.stderr)
+    return not errors
+
+
+def generate_batch(
+    template: ProjectTemplate, configs: Iterable[dict], args: argparse.Namespace
+):
+    """Generate (and with ``--build``, compile) the projects of a batch, skipping invalid configs.
+
+    Invalid configs are reported as soon as they are read, and make the command
+    fail once the rest of the batch was processed.
+    """
+    invalid = []
+
+    def skip_invalid(error: InvalidConfigError):
+        print(error, file=sys.stderr)
+        invalid.append(error)
+
+    results = []
+    if args.build:
+        results = template.compile_pdf_many(
+            configs,
+            build_dir_pattern=args.output_pattern,
+            jobs=args.jobs,
+            timeout=args.timeout,
+            verbose=args.verbose,
+            only_changed=not args.rewrite,
+            workers=args.workers,
+            copy_strategy=args.copy_strategy,
+            on_invalid=skip_invalid,
+        )
+    else:
+        for config, target_dir in template.iter_batch(
+            configs, args.output_pattern, skip_invalid
+        ):
+            report = template.generate(
+                config,
+                target_dir,
+                only_changed=not args.rewrite,
+                workers=args.workers,
+                copy_strategy=args.copy_strategy,
+            )
+            if args.verbose:
+                print(f"Generated {target_dir}: {report}")
+
+    if invalid:
+        print(f"Skipped {len(invalid)} invalid configs.", file=sys.stderr)
+    report_build_results(results)
+    if invalid:
+        sys.exit(1)
+
+
+def column_mapping(mapping: str) -> Tuple[str, str]:
+    """Parse a ``COLUMN=KEY`` argument."""
+    column, sep, key = mapping.partition("=")
+    if not sep or not column:
+        raise argparse.ArgumentTypeError(f"expected COLUMN=KEY, got '{mapping}'")
+    return column, key
+
+
+def add_workers_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--workers",
+        "-w",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Render and write the files of each project in N threads.",
+    )
+
+
+def add_copy_strategy_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--copy-strategy",
+        choices=COPY_STRATEGIES,
+        default="copy",
+        help=(
+            "How raw files are placed into the generated projects; links share the "
+            "files with the template, and unsupported strategies fall back to "
+            "copying [default=copy]"
+        ),
+    )
+
+
+def add_build_pool_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Number of concurrent latexmk processes [default=number of CPUs]",
+    )
+    parser.add_argument(
+        "--timeout",
+        metavar="SECONDS",
+        type=float,
+        default=None,
+        help="Abort each latexmk process after the given number of seconds.",
+    )
+
+
+def report_build_results(results: List[BuildResult]):
+    failed = [result for result in results if not result.ok]
+    for result in failed:
+        print(
+            f"Building {result.build_dir / result.main_file} {result.failure}",
+            file=sys.stderr,
+        )
+    if failed:
+        sys.exit(1)
+
+
+def report_timings(
+    collector: timing.TimingCollector, table: bool, json_file: Optional[str]
+):
+    if table:
+        print(collector.format_table(), file=sys.stderr)
+    if json_file == "-":
+        collector.write_json(sys.stdout)
+    elif json_file is not None:
+        with open(json_file, "w") as out:
+            collector.write_json(out)
+
+
+def parse_args(template_path=None):
+    if "_ARGCOMPLETE" in os.environ:
+        import argcomplete
+        from argcomplete.completers import DirectoriesCompleter, FilesCompleter
+
+        def complete_template(parsed_args, **kwargs):
+            if template_path is None:
+                return []
+            cache_dir = None
+            if not parsed_args.no_cache:
+                cache_dir = parsed_args.cache_dir or cache.default_cache_dir()
+            return list(enumerate_templates(template_path, cache_dir=cache_dir))
+
+    else:
+        argcomplete = DirectoriesCompleter = FilesCompleter = None
+        complete_template = None
+
     # noinspection PyTypeChecker
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -415,6 +1652,29 @@ def parse_args(template_path=None):
         ),
     )
     parser.add_argument("--verbose", "-v", action="store_true")
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        type=Path,
+        default=None,
+        help=f"Directory for persistent caches [default=${cache.CACHE_DIR_ENV_VAR} or XDG cache]",
+    ).completer = DirectoriesCompleter
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the persistent caches of templates and PDFs.",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print the time spent in each stage (loading, rendering, latexmk) to stderr.",
+    )
+    parser.add_argument(
+        "--timings-json",
+        metavar="FILE",
+        default=None,
+        help="Write the time spent in each stage as JSON to FILE (- for stdout).",
+    ).completer = FilesCompleter
     parser.add_argument(
         "--import",
         metavar="PYTHON_FILE",
@@ -429,6 +1689,43 @@ def parse_args(template_path=None):
 
     parser_list = commands.add_parser("list", help="List all available templates.")
     parser_list.set_defaults(command="list")
+    parser_list.add_argument(
+        "--long",
+        "-l",
+        action="store_true",
+        help="Also show the path and description of each template.",
+    )
+
+    parser_reindex = commands.add_parser(
+        "reindex",
+        help="Write an index file describing the templates in each template directory.",
+    )
+    parser_reindex.set_defaults(command="reindex")
+    parser_reindex.add_argument(
+        "directories",
+        metavar="DIR",
+        type=Path,
+        nargs="*",
+        help=(
+            "Template directories to be indexed [default=those of the template path "
+            "owned by the user, except for the templates bundled with this package]"
+        ),
+    ).completer = DirectoriesCompleter
+
+    parser_cache = commands.add_parser(
+        "cache", help="Show information about the persistent caches."
+    )
+    parser_cache.set_defaults(command="cache")
+    parser_cache.add_argument(
+        "--clear", action="store_true", help="Remove all cached entries."
+    )
+    parser_cache.add_argument(
+        "--max-age",
+        metavar="DAYS",
+        type=float,
+        default=None,
+        help="Remove build directories that were not used in the given number of days.",
+    )
 
     parser_genconf = commands.add_parser(
         "genconf", help="Generate a default config file for the given template."
@@ -439,8 +1736,7 @@ def parse_args(template_path=None):
         type=str,
         metavar="TEMPLATE",
         help="Name of the desired template.",
-        choices=templates,
-    )
+    ).completer = complete_template
     parser_genconf.add_argument(
         "--output-file",
         "-o",
@@ -457,8 +1753,7 @@ def parse_args(template_path=None):
         "template",
         metavar="TEMPLATE",
         help="Name of the desired template.",
-        choices=templates,
-    )
+    ).completer = complete_template
     parser_gen.add_argument(
         "output_dir",
         metavar="OUT_DIR",
@@ -478,6 +1773,151 @@ def parse_args(template_path=None):
         action="store_true",
         help="Build the generated template with latexmk.",
     )
+    parser_gen.add_argument(
+        "--archive",
+        "-a",
+        default=False,
+        action="store_true",
+        help=(
+            "Write the project into the archive OUT_DIR instead (.zip, .tar or "
+            ".tar.gz), or into a zip archive on the standard output if OUT_DIR is -."
+        ),
+    )
+    add_rewrite_argument(parser_gen)
+    add_workers_argument(parser_gen)
+    add_copy_strategy_argument(parser_gen)
+
+    parser_watch = commands.add_parser(
+        "watch",
+        help="Generate a project and regenerate it whenever its config or template changes.",
+    )
+    parser_watch.set_defaults(command="watch")
+    parser_watch.add_argument(
+        "template",
+        metavar="TEMPLATE",
+        help="Name of the desired template.",
+    ).completer = complete_template
+    parser_watch.add_argument(
+        "output_dir",
+        metavar="OUT_DIR",
+        help="Directory where the generated files will be written.",
+    ).completer = DirectoriesCompleter
+    parser_watch.add_argument(
+        "--config-file",
+        "-c",
+        metavar="FILE",
+        default="./config.yaml",
+        help="Configuration file for the template [default=./config.yaml]",
+    ).completer = FilesCompleter
+    parser_watch.add_argument(
+        "--no-build",
+        dest="build",
+        action="store_false",
+        help="Do not compile the project continuously with latexmk.",
+    )
+    parser_watch.add_argument(
+        "--debounce",
+        metavar="SECONDS",
+        type=float,
+        default=None,
+        help="Wait for changes to settle before regenerating [default=0.2]",
+    )
+
+    parser_batch = commands.add_parser(
+        "batch", help="Generate one project for each config of a batch."
+    )
+    parser_batch.set_defaults(command="batch")
+    parser_batch.add_argument(
+        "template",
+        metavar="TEMPLATE",
+        help="Name of the desired template.",
+    ).completer = complete_template
+    parser_batch.add_argument(
+        "configs",
+        metavar="CONFIGS",
+        help=(
+            "Multi-document YAML file, JSON Lines file, CSV file or directory of "
+            "config files."
+        ),
+    ).completer = FilesCompleter
+    parser_batch.add_argument(
+        "--column",
+        metavar="COLUMN=KEY",
+        action="append",
+        type=column_mapping,
+        default=[],
+        help=(
+            "Config key for a column of a CSV file, with dots separating nested "
+            "keys, or nothing to ignore the column; may be repeated."
+        ),
+    )
+    parser_batch.add_argument(
+        "--output-pattern",
+        "-o",
+        metavar="PATTERN",
+        default=r"\EXPR{ name }",
+        help=r"Template for the directory of each project [default=\EXPR{ name }]",
+    )
+    parser_batch.add_argument(
+        "--build",
+        "-b",
+        default=False,
+        action="store_true",
+        help="Build each generated project with latexmk.",
+    )
+    parser_batch.add_argument(
+        "--check",
+        default=False,
+        action="store_true",
+        help=(
+            "Only validate all configs of the batch (including their output "
+            "directories), reporting every invalid one, without generating anything."
+        ),
+    )
+    add_rewrite_argument(parser_batch)
+    add_workers_argument(parser_batch)
+    add_copy_strategy_argument(parser_batch)
+    add_build_pool_arguments(parser_batch)
+
+    parser_compile = commands.add_parser(
+        "compile",
+        help="Compile a template and the library templates it uses into a bundle.",
+    )
+    parser_compile.set_defaults(command="compile")
+    parser_compile.add_argument(
+        "template",
+        metavar="TEMPLATE",
+        help="Name of the desired template.",
+    ).completer = complete_template
+    parser_compile.add_argument(
+        "output_dir",
+        metavar="OUT_DIR",
+        type=Path,
+        help="Directory where the bundle will be written, replacing a previous bundle.",
+    ).completer = DirectoriesCompleter
+
+    parser_serve = commands.add_parser(
+        "serve",
+        help="Serve render and build requests over HTTP, keeping templates loaded.",
+    )
+    parser_serve.set_defaults(command="serve")
+    parser_serve.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on [default=127.0.0.1]",
+    )
+    parser_serve.add_argument(
+        "--port", "-p", type=int, default=8642, help="Port to listen on [default=8642]"
+    )
+    parser_serve.add_argument(
+        "--socket",
+        metavar="PATH",
+        dest="unix_socket",
+        type=Path,
+        default=None,
+        help="Listen on a Unix socket instead of a TCP port.",
+    ).completer = FilesCompleter
+    add_build_pool_arguments(parser_serve)
 
     parser_build = commands.add_parser(
         "build", help="Generate a PDF document from a template"
@@ -487,8 +1927,7 @@ def parse_args(template_path=None):
         "template",
         metavar="TEMPLATE",
         help="Name of the desired template.",
-        choices=templates,
-    )
+    ).completer = complete_template
     parser_build.add_argument(
         "--output-file", "-o", metavar="FILE", type=Path, default=None
     ).completer = FilesCompleter
@@ -496,8 +1935,12 @@ def parse_args(template_path=None):
         "--config-file",
         "-c",
         metavar="FILE",
-        default="./config.yaml",
-        help="Configuration file for the template [default=./config.yaml]",
+        action="append",
+        default=None,
+        help=(
+            "Configuration file for the template, may be repeated to build several "
+            "documents into the output directory [default=./config.yaml]"
+        ),
     ).completer = FilesCompleter
     parser_build.add_argument(
         "--force-overwrite",
@@ -505,8 +1948,10 @@ def parse_args(template_path=None):
         action="store_true",
         help="Overwrite the output file if it exists, instead of adding a suffix.",
     )
+    add_build_pool_arguments(parser_build)
 
-    argcomplete.autocomplete(parser)
+    if argcomplete is not None:
+        argcomplete.autocomplete(parser)
     return parser.parse_args()
 
 
@@ -514,30 +1959,150 @@ def main():
     template_path, lib_path = search_paths()
     args = parse_args(template_path)
 
+    collector = None
+    if args.timings or args.timings_json is not None:
+        collector = timing.TimingCollector()
+        timing.set_collector(collector)
+    try:
+        run_command(args, template_path, lib_path)
+    except (InvalidConfigError, BuildError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if collector is not None:
+            report_timings(collector, args.timings, args.timings_json)
+
+
+def run_command(
+    args: argparse.Namespace, template_path: SearchPath, lib_path: SearchPath
+):
     if args.verbose:
         print(f"Template lookup paths: {template_path}")
 
     for module in args.import_modules:
         runpy.run_path(module)
+    if args.import_modules:
+        enable_tags()
 
-    if args.command == "list":
-        for template in enumerate_templates(template_path, args.verbose):
-            print(template)
+    if args.command == "cache":
+        cache_dir = args.cache_dir or cache.default_cache_dir()
+    elif args.no_cache:
+        cache_dir = None
     else:
-        template = ProjectTemplate.find(
-            args.template, template_path, lib_path, verbose=args.verbose
+        cache_dir = args.cache_dir or cache.default_cache_dir()
+
+    if args.command == "list" and getattr(args, "long", False):
+        for name, path, description in describe_templates(template_path):
+            print(f"{name}\t{path}\t{description}")
+    elif args.command == "list":
+        for template in enumerate_templates(template_path, args.verbose, cache_dir):
+            print(template)
+    elif args.command == "reindex":
+        directories = args.directories or user_template_dirs(template_path)
+        reindex_templates(directories, lib_path, args.verbose)
+    elif args.command == "serve":
+        from .server import RenderService, serve
+
+        service = RenderService(
+            template_path,
+            lib_path,
+            cache_dir=cache_dir,
+            jobs=args.jobs,
+            timeout=args.timeout,
+            verbose=args.verbose,
         )
+        serve(service, host=args.host, port=args.port, unix_socket=args.unix_socket)
+    elif args.command == "cache":
+        max_age = None if args.max_age is None else args.max_age * 24 * 60 * 60
+        manage_cache(cache_dir, args.clear, max_age)
+    else:
+        try:
+            template = ProjectTemplate.find(
+                args.template,
+                template_path,
+                lib_path,
+                verbose=args.verbose,
+                bytecode_cache=open_bytecode_cache(cache_dir, args.verbose),
+            )
+        except ProjectTemplateNotFoundError as e:
+            available = ", ".join(
+                enumerate_templates(template_path, cache_dir=cache_dir)
+            )
+            print(f"{e} Available templates: {available}", file=sys.stderr)
+            sys.exit(2)
 
         if args.command == "genconf":
             generate_config(template, args.output_file)
 
+        elif args.command == "compile":
+            try:
+                bundle = template.compile_bundle(args.output_dir, args.verbose)
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                sys.exit(1)
+            if args.verbose:
+                print(f"Compiled {template.name} into {bundle}")
+
+        elif args.command == "watch":
+            from .watch import DEFAULT_DEBOUNCE, watch_project
+
+            watch_project(
+                template,
+                args.config_file,
+                args.output_dir,
+                build=args.build,
+                debounce=DEFAULT_DEBOUNCE if args.debounce is None else args.debounce,
+                verbose=args.verbose,
+            )
+
+        elif args.command == "batch":
+            configs = iter_configs(args.configs, dict(args.column))
+            if args.check:
+                if not check_batch(template, configs, args.output_pattern):
+                    sys.exit(1)
+            else:
+                generate_batch(template, configs, args)
+
+        elif args.command == "build" and args.config_file and len(args.config_file) > 1:
+            output_dir = args.output_file or Path()
+            if not output_dir.is_dir():
+                print(
+                    "The output must be a directory when building several configs.",
+                    file=sys.stderr,
+                )
+                sys.exit(1)
+
+            results = template.compile_pdf_many(
+                [load_config(config_file) for config_file in args.config_file],
+                output_dir=output_dir,
+                overwrite=args.force_overwrite,
+                jobs=args.jobs,
+                timeout=args.timeout,
+                verbose=args.verbose,
+                pdf_cache=open_pdf_cache(cache_dir, args.verbose),
+                build_pool=open_build_pool(cache_dir, args.verbose),
+            )
+            report_build_results(results)
+
+        elif args.command == "build":
+            config_files = args.config_file or ["./config.yaml"]
+            template.compile_pdf(
+                load_config(config_files[0]),
+                output_path=args.output_file or Path(),
+                verbose=args.verbose,
+                overwrite=args.force_overwrite,
+                timeout=args.timeout,
+                pdf_cache=open_pdf_cache(cache_dir, args.verbose),
+                build_pool=open_build_pool(cache_dir, args.verbose),
+            )
+
         else:
-            with open(args.config_file) as config_file:
-                config = yaml.full_load(config_file)
-            config['cwd'] = Path(args.config_file).resolve().parent
+            config = load_config(args.config_file)
 
             if args.command == "generate":
-                if args.build:
+                if args.archive:
+                    generate_archive(template, config, args.output_dir, args.build)
+                elif args.build:
                     template.compile_pdf(
                         config,
                         build_dir=args.output_dir,
@@ -545,15 +2110,15 @@ def main():
                         overwrite=True,
                     )
                 else:
-                    template.generate(config, args.output_dir)
-
-            elif args.command == "build":
-                template.compile_pdf(
-                    config,
-                    output_path=args.output_file or Path(),
-                    verbose=args.verbose,
-                    overwrite=args.force_overwrite,
-                )
+                    report = template.generate(
+                        config,
+                        args.output_dir,
+                        only_changed=not args.rewrite,
+                        workers=args.workers,
+                        copy_strategy=args.copy_strategy,
+                    )
+                    if args.verbose:
+                        print(f"Generated {args.output_dir}: {report}")
 
 
 if __name__ == "__main__":
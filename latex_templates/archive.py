@@ -0,0 +1,100 @@
+"""
+Writing generated projects into zip or tar archives, without touching the filesystem.
+
+Archives may be written to unseekable streams (e.g. a pipe or an HTTP response).
+Rendered files are streamed into zip archives chunk by chunk, while tar entries
+must be buffered because their size precedes their contents.
+"""
+
+import io
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, Union
+
+__all__ = ["ARCHIVE_FORMATS", "ArchiveWriter", "archive_format"]
+
+ARCHIVE_FORMATS = {
+    "zip": ".zip",
+    "tar": ".tar",
+    "tar.gz": ".tar.gz",
+}
+_SUFFIXES = {".zip": "zip", ".tar": "tar", ".tar.gz": "tar.gz", ".tgz": "tar.gz"}
+
+
+def archive_format(path: Union[str, Path]) -> str:
+    """Infer the format of an archive from its filename.
+
+    :raise:
+    ValueError when the suffix of the filename is not recognized.
+    """
+    name = Path(path).name.lower()
+    for suffix, format in _SUFFIXES.items():
+        if name.endswith(suffix):
+            return format
+    raise ValueError(
+        f"Cannot infer the archive format of '{path}', "
+        f"expected one of: {', '.join(_SUFFIXES)}"
+    )
+
+
+class ArchiveWriter:
+    """Adds files to a zip or tar archive written to a binary file object."""
+
+    def __init__(self, fileobj: BinaryIO, format: str = "zip"):
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError(
+                f"Unknown archive format '{format}', "
+                f"expected one of: {', '.join(ARCHIVE_FORMATS)}"
+            )
+        self.format = format
+        if format == "zip":
+            self.__zip = zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED)
+            self.__tar = None
+        else:
+            mode = "w|gz" if format == "tar.gz" else "w|"
+            self.__zip = None
+            self.__tar = tarfile.open(fileobj=fileobj, mode=mode)
+
+    def add_chunks(self, name: str, chunks: Iterable[str], encoding: str = "utf-8"):
+        """Add a file whose (textual) contents are produced piecewise, e.g. by ``jinja2.Template.generate``."""
+        if self.__zip is not None:
+            with self.__zip.open(self.__zip_info(name), "w") as entry:
+                for chunk in chunks:
+                    entry.write(chunk.encode(encoding))
+        else:
+            self.add_bytes(name, "".join(chunks).encode(encoding))
+
+    def add_bytes(self, name: str, content: bytes):
+        if self.__zip is not None:
+            self.__zip.writestr(self.__zip_info(name), content)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self.__tar.addfile(info, io.BytesIO(content))
+
+    def add_file(self, name: str, path: Union[str, Path]):
+        """Add a copy of an existing file, keeping its modification time."""
+        if self.__zip is not None:
+            self.__zip.write(str(path), name)
+        else:
+            self.__tar.add(str(path), name, recursive=False)
+
+    @staticmethod
+    def __zip_info(name: str) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        return info
+
+    def close(self):
+        (self.__zip or self.__tar).close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
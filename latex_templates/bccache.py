@@ -0,0 +1,62 @@
+"""
+Persistent Jinja bytecode cache.
+
+Kept apart from ``latex_templates.cache`` so that Jinja is only imported when
+templates are actually rendered.
+"""
+
+import os
+from pathlib import Path
+from typing import Union
+
+import jinja2
+
+from .cache import (
+    BYTECODE_SUBDIR,
+    DEFAULT_BYTECODE_CACHE_SIZE,
+    CacheInfo,
+    default_cache_dir,
+    directory_info,
+    evict_lru,
+)
+
+__all__ = ["SizeBoundedBytecodeCache"]
+
+
+class SizeBoundedBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """
+    Jinja bytecode cache stored on the filesystem, bounded by total size.
+
+    Entries are keyed by Jinja on the template name and the full path of its
+    source (thus on the search path), and invalidated by the checksum of the
+    source.  Whenever the total size exceeds ``max_bytes``, the least recently
+    used entries are removed.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path, None] = None,
+        max_bytes: int = DEFAULT_BYTECODE_CACHE_SIZE,
+    ):
+        if directory is None:
+            directory = default_cache_dir() / BYTECODE_SUBDIR
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        super().__init__(str(directory))
+        self.max_bytes = max_bytes
+
+    def load_bytecode(self, bucket: jinja2.bccache.Bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is not None:
+            try:
+                os.utime(self._get_cache_filename(bucket))
+            except OSError:
+                pass
+
+    def dump_bytecode(self, bucket: jinja2.bccache.Bucket):
+        super().dump_bytecode(bucket)
+        evict_lru(self.directory, self.max_bytes)
+
+    def info(self) -> CacheInfo:
+        return directory_info(self.directory)
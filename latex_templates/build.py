@@ -0,0 +1,393 @@
+"""
+Running ``latexmk`` on generated projects, either one at a time or concurrently.
+
+Builds may also be driven by an asyncio event loop with ``arun_latexmk``.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from . import timing
+from .cache import default_cache_dir
+
+if TYPE_CHECKING:
+    import asyncio.subprocess
+    import subprocess
+    from concurrent.futures import Future
+
+__all__ = [
+    "BuildDirPool",
+    "BuildError",
+    "BuildResult",
+    "BuildScheduler",
+    "arun_latexmk",
+    "config_identity",
+    "latexmk_command",
+    "run_latexmk",
+]
+
+BUILDS_SUBDIR = "builds"
+DEFAULT_BUILD_DIR_MAX_AGE = 7 * 24 * 60 * 60
+
+
+class BuildResult(NamedTuple):
+    build_dir: Path
+    main_file: Path
+    returncode: Optional[int]
+    log: Optional[str]
+    timed_out: bool = False
+    pdf: Optional[Path] = None
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    @property
+    def generated_pdf(self) -> Path:
+        """Path of the PDF produced by latexmk inside the build directory."""
+        return (self.build_dir / self.main_file).with_suffix(".pdf")
+
+    @property
+    def failure(self) -> Optional[str]:
+        """Description of how the build failed, or None if it succeeded."""
+        if self.timed_out:
+            return "timed out"
+        if self.returncode != 0:
+            return f"failed with exit code {self.returncode}"
+        return None
+
+
+class BuildError(Exception):
+    """latexmk failed to compile a project, whose log (if captured) is part of the message."""
+
+    def __init__(self, result: BuildResult):
+        self.result = result
+        message = f"Building {result.build_dir / result.main_file} {result.failure}"
+        if result.log:
+            message += ":\n" + result.log.rstrip()
+        super().__init__(message)
+
+
+def latexmk_command(main_file: Union[str, Path], continuous: bool = False) -> List[str]:
+    """Command line for compiling a main file, optionally rebuilding whenever its sources change."""
+    if continuous:
+        return ["latexmk", "-pdf", "-pvc", "-view=none", str(main_file)]
+    return ["latexmk", "-pdf", str(main_file)]
+
+
+def run_latexmk(
+    build_dir: Union[str, Path],
+    main_file: Union[str, Path],
+    *,
+    timeout: Optional[float] = None,
+    stream: bool = False,
+) -> BuildResult:
+    """Compile the main file of a generated project with latexmk.
+
+    :param build_dir:
+    Directory containing the generated project.
+
+    :param main_file:
+    Path of the main TeX file, relative to ``build_dir``.
+
+    :param timeout:
+    Optional number of seconds after which latexmk and all LaTeX processes it
+    started are killed.
+
+    :param stream:
+    If true, write the output of latexmk to the standard output and error.
+    Otherwise, the combined output is captured in the result's ``log``.
+    """
+    build_dir, main_file = Path(build_dir), Path(main_file)
+    with timing.span("latexmk", build_dir / main_file):
+        return _run_latexmk(build_dir, main_file, timeout, stream)
+
+
+def _run_latexmk(
+    build_dir: Path, main_file: Path, timeout: Optional[float], stream: bool
+) -> BuildResult:
+    import subprocess
+
+    process = subprocess.Popen(
+        latexmk_command(main_file),
+        cwd=str(build_dir),
+        stdin=subprocess.DEVNULL,
+        stdout=sys.stdout if stream else subprocess.PIPE,
+        stderr=sys.stderr if stream else subprocess.STDOUT,
+        start_new_session=True,
+    )
+    try:
+        output, _ = process.communicate(timeout=timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        _kill_process_group(process)
+        output, _ = process.communicate()
+        timed_out = True
+
+    log = None if stream else output.decode("utf-8", errors="replace")
+    return BuildResult(build_dir, main_file, process.returncode, log, timed_out)
+
+
+async def arun_latexmk(
+    build_dir: Union[str, Path],
+    main_file: Union[str, Path],
+    *,
+    timeout: Optional[float] = None,
+    on_output: Optional[Callable[[str], None]] = None,
+) -> BuildResult:
+    """Compile the main file of a generated project with latexmk, without blocking the event loop.
+
+    If the timeout expires or the calling task is cancelled, latexmk and all
+    LaTeX processes it started are killed.  Cancellation is then propagated.
+
+    :param build_dir:
+    Directory containing the generated project.
+
+    :param main_file:
+    Path of the main TeX file, relative to ``build_dir``.
+
+    :param timeout:
+    Optional number of seconds after which the build is aborted.
+
+    :param on_output:
+    Optional callback receiving the output of latexmk as it is produced.
+    The combined output is always captured in the result's ``log``.
+    """
+    import asyncio
+    import codecs
+
+    build_dir, main_file = Path(build_dir), Path(main_file)
+    process = await asyncio.create_subprocess_exec(
+        *latexmk_command(main_file),
+        cwd=str(build_dir),
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        start_new_session=True,
+    )
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    output = []
+
+    async def communicate():
+        while True:
+            chunk = await process.stdout.read(64 * 1024)
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                output.append(text)
+                if on_output is not None:
+                    on_output(text)
+            if not chunk:
+                break
+        await process.wait()
+
+    timed_out = False
+    with timing.span("latexmk", build_dir / main_file):
+        try:
+            await asyncio.wait_for(communicate(), timeout)
+        except asyncio.TimeoutError:
+            _kill_process_group(process)
+            await process.wait()
+            timed_out = True
+        except BaseException:
+            _kill_process_group(process)
+            await asyncio.shield(process.wait())
+            raise
+
+    return BuildResult(
+        build_dir, main_file, process.returncode, "".join(output), timed_out
+    )
+
+
+def _kill_process_group(
+    process: Union["subprocess.Popen", "asyncio.subprocess.Process"],
+):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+
+class BuildScheduler:
+    """
+    Pool running several latexmk processes concurrently.
+
+    Builds are submitted with ``submit``, which blocks while ``queue_size`` builds
+    are already pending, so that generating projects does not run arbitrarily
+    far ahead of compiling them.  The scheduler should be used as a context
+    manager, which waits for all builds to finish when exiting.
+    """
+
+    def __init__(
+        self,
+        jobs: Optional[int] = None,
+        *,
+        timeout: Optional[float] = None,
+        queue_size: Optional[int] = None,
+    ):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.jobs = jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self.__slots = threading.BoundedSemaphore(queue_size or 2 * self.jobs)
+        self.__executor = ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="latexmk"
+        )
+
+    def submit(
+        self, build_dir: Union[str, Path], main_file: Union[str, Path]
+    ) -> "Future[BuildResult]":
+        self.__slots.acquire()
+        try:
+            future = self.__executor.submit(
+                run_latexmk, build_dir, main_file, timeout=self.timeout
+            )
+        except BaseException:
+            self.__slots.release()
+            raise
+        future.add_done_callback(lambda _: self.__slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self.__executor.shutdown(wait=wait)
+
+    def __enter__(self) -> "BuildScheduler":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+def config_identity(config: dict) -> str:
+    """Identify the project built from a config, so that edited versions of it share a build directory.
+
+    The identity is given by the directory of the config file and the project name,
+    which are not expected to change when the config is edited.
+    """
+    return json.dumps([str(config.get("cwd")), str(config.get("name"))])
+
+
+class BuildDirPool:
+    """
+    Persistent build directories, reused across invocations so that latexmk can work incrementally.
+
+    Build directories are keyed on the template name and the identity of the
+    config (see ``config_identity``).  While a directory is in use, it is locked
+    so that concurrent builds of the same project use different directories.
+    Directories that were not used for ``max_age`` seconds are removed by ``cleanup``.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path, None] = None,
+        max_age: float = DEFAULT_BUILD_DIR_MAX_AGE,
+    ):
+        if directory is None:
+            directory = default_cache_dir() / BUILDS_SUBDIR
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+
+    @contextmanager
+    def acquire(self, template_name: str, identity: str) -> Iterator[Path]:
+        """Lock and provide a build directory for the given project, creating it if necessary."""
+        digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+        slot = 0
+        while True:
+            build_dir = self.directory / f"{template_name}-{digest}-{slot}"
+            lock = self.__try_lock(build_dir)
+            if lock is not None:
+                break
+            slot += 1
+
+        try:
+            build_dir.mkdir(exist_ok=True)
+            yield build_dir
+        finally:
+            self.__unlock(build_dir, lock)
+
+    def cleanup(self, max_age: Optional[float] = None) -> int:
+        """Remove the build directories that were not used recently and are not locked.
+
+        :return:
+        Number of removed directories.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        deadline = time.time() - max_age
+        removed = 0
+        for build_dir in self.directory.iterdir():
+            if not build_dir.is_dir():
+                continue
+            lock_file = self.__lock_file(build_dir)
+            try:
+                if lock_file.stat().st_mtime > deadline:
+                    continue
+            except FileNotFoundError:
+                pass
+
+            lock = self.__try_lock(build_dir)
+            if lock is None:
+                continue
+            try:
+                shutil.rmtree(str(build_dir), ignore_errors=True)
+                removed += 1
+                lock_file.unlink()
+            except OSError:
+                pass
+            finally:
+                self.__unlock(build_dir, lock)
+        return removed
+
+    @staticmethod
+    def __lock_file(build_dir: Path) -> Path:
+        return build_dir.with_name(build_dir.name + ".lock")
+
+    def __try_lock(self, build_dir: Path) -> Optional[int]:
+        lock_file = self.__lock_file(build_dir)
+        if fcntl is None:
+            try:
+                return os.open(str(lock_file), os.O_CREAT | os.O_EXCL | os.O_RDWR)
+            except FileExistsError:
+                return None
+
+        fd = os.open(str(lock_file), os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        os.utime(fd)
+        return fd
+
+    def __unlock(self, build_dir: Path, fd: int):
+        os.close(fd)
+        if fcntl is None:
+            try:
+                self.__lock_file(build_dir).unlink()
+            except OSError:
+                pass
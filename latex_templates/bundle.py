@@ -0,0 +1,250 @@
+"""
+Precompiled bundles of templates, for deployments that should start rendering right away.
+
+``latex-templates compile`` turns a template into a bundle, which is a template
+directory itself (so it may be put into the template path or be passed to
+``ProjectTemplate``) containing:
+
+  - the files of the template, i.e. its default config, schema, contents template
+    and raw files, as well as the sources of its file templates;
+  - ``modules/``, the file templates and the library templates they include or
+    import, as well as those named literally in the contents template, compiled
+    into Python modules by ``jinja2.Environment.compile_templates`` (and into
+    bytecode for the running Python version);
+  - ``bundle.json``, recording the version of Jinja2 the modules were compiled
+    with and the inputs of each file template (see ``latex_templates.deps``).
+
+The templates of a bundle are loaded by ``jinja2.ModuleLoader``, i.e. imported
+once each, instead of being looked up in the template and library directories,
+parsed and compiled (or fetched from the bytecode cache) by every process.
+Bundles depend on the version of Jinja2, and must be compiled again after
+upgrading it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Union
+
+from .deps import DependencyTracker, TemplateInputs, fingerprint_inputs
+
+if TYPE_CHECKING:
+    import jinja2
+
+__all__ = [
+    "BUNDLE_FILE",
+    "BundleDependencies",
+    "BundleInfo",
+    "MODULES_DIR",
+    "compile_bundle",
+    "read_bundle",
+]
+
+BUNDLE_FILE = "bundle.json"
+BUNDLE_VERSION = 1
+MODULES_DIR = "modules"
+
+
+class BundleInfo(NamedTuple):
+    template: str
+    jinja2_version: str
+    templates: List[str]
+    inputs: Dict[str, Optional[TemplateInputs]]
+
+
+def read_bundle(root_dir: Union[str, Path]) -> Optional[BundleInfo]:
+    """Read the description of a bundle, or return None if the directory is not a bundle.
+
+    :raise:
+    ValueError when the bundle was compiled for another version of Jinja2 or
+    of this package.
+    """
+    path = Path(root_dir) / BUNDLE_FILE
+    try:
+        with open(str(path)) as bundle_file:
+            data = json.load(bundle_file)
+    except FileNotFoundError:
+        return None
+
+    import jinja2
+
+    if data.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"Unsupported bundle format in {path}, compile it again.")
+    if data["jinja2"] != jinja2.__version__:
+        raise ValueError(
+            f"The bundle {path.parent} was compiled with Jinja2 {data['jinja2']}, "
+            f"but version {jinja2.__version__} is installed; compile it again."
+        )
+    inputs = {
+        name: (
+            None
+            if entry is None
+            else TemplateInputs(
+                {BUNDLE_FILE: entry["digest"]}, frozenset(entry["keys"])
+            )
+        )
+        for name, entry in data["inputs"].items()
+    }
+    return BundleInfo(data["template"], data["jinja2"], data["templates"], inputs)
+
+
+class BundleDependencies:
+    """Fingerprints of the inputs of the templates of a bundle, as recorded when it was compiled."""
+
+    def __init__(self, info: BundleInfo):
+        self.__inputs = info.inputs
+
+    def fingerprint(self, name: str, config: dict) -> Optional[str]:
+        return fingerprint_inputs(self.__inputs.get(name), config)
+
+
+def compile_bundle(
+    name: str,
+    root_dir: Path,
+    env: "jinja2.Environment",
+    dependencies: DependencyTracker,
+    output_dir: Union[str, Path],
+    verbose: bool = False,
+) -> Path:
+    """Compile a template into a bundle, replacing any previous bundle in the output directory.
+
+    The bundle is assembled next to the output directory and moved into place
+    when complete, so that a process loading the bundle never sees it half-written.
+
+    :param name:
+    Name of the template.
+
+    :param root_dir:
+    Directory of the template.
+
+    :param env:
+    Environment of the template, whose loader finds its file templates and libraries.
+
+    :param dependencies:
+    Tracker of the inputs of the templates of ``env``.
+
+    :param output_dir:
+    Directory of the bundle, which must not exist unless it contains a bundle.
+
+    :return:
+    The output directory.
+    """
+    import compileall
+
+    import jinja2
+
+    output_dir = Path(output_dir)
+    if output_dir.exists() and not (output_dir / BUNDLE_FILE).is_file():
+        raise ValueError(f"Refusing to replace '{output_dir}', which is not a bundle.")
+    output_dir.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(mkdtemp(prefix=f".{output_dir.name}.", dir=str(output_dir.parent)))
+
+    try:
+        bundle_dir = staging / "bundle"
+        shutil.copytree(str(root_dir), str(bundle_dir))
+
+        templates = [
+            path.relative_to(root_dir).as_posix()
+            for path in sorted(root_dir.rglob("*"))
+            if path.is_file() and _is_text(path)
+        ]
+        contents = (root_dir / "contents.yaml").read_text(encoding="utf-8")
+        libraries = [
+            template
+            for template in env.list_templates()
+            if template not in templates and template in contents
+        ]
+
+        inputs = {}
+        sources = set()
+        for template in templates + libraries:
+            try:
+                template_inputs = dependencies.inputs(template)
+            except (jinja2.TemplateSyntaxError, UnicodeDecodeError):
+                # Not a template after all, e.g. a raw file with unbalanced delimiters
+                continue
+            if template in templates:
+                inputs[template] = template_inputs
+            if template_inputs is None:
+                sources = None
+            elif sources is not None:
+                sources.update(template_inputs.sources)
+
+        candidates = []
+
+        def is_needed(template: str) -> bool:
+            filename = dependencies.resolve(template)
+            if filename is None or not _is_text(Path(filename)):
+                return False
+            # Templates with dynamic includes may include any library template
+            if sources is None or template in inputs or filename in sources:
+                candidates.append(template)
+                return True
+            return False
+
+        modules_dir = bundle_dir / MODULES_DIR
+        modules_dir.mkdir()
+        env.compile_templates(
+            str(modules_dir),
+            filter_func=is_needed,
+            zip=None,
+            log_function=print if verbose else None,
+        )
+        compileall.compile_dir(str(modules_dir), quiet=1)
+        # Templates with syntax errors are skipped by compile_templates
+        compiled = [
+            template
+            for template in candidates
+            if (
+                modules_dir / jinja2.ModuleLoader.get_module_filename(template)
+            ).exists()
+        ]
+
+        data = {
+            "version": BUNDLE_VERSION,
+            "template": name,
+            "jinja2": jinja2.__version__,
+            "templates": sorted(compiled),
+            "inputs": {
+                template: (
+                    None
+                    if template_inputs is None
+                    else {
+                        "digest": _digest_sources(template_inputs),
+                        "keys": sorted(template_inputs.keys),
+                    }
+                )
+                for template, template_inputs in sorted(inputs.items())
+            },
+        }
+        with open(str(bundle_dir / BUNDLE_FILE), "w") as bundle_file:
+            json.dump(data, bundle_file, indent=2, sort_keys=True)
+            bundle_file.write("\n")
+
+        if output_dir.exists():
+            os.replace(str(output_dir), str(staging / "previous"))
+        os.replace(str(bundle_dir), str(output_dir))
+    finally:
+        shutil.rmtree(str(staging), ignore_errors=True)
+
+    return output_dir
+
+
+def _is_text(path: Path) -> bool:
+    try:
+        path.read_text(encoding="utf-8")
+    except (UnicodeDecodeError, OSError):
+        return False
+    return True
+
+
+def _digest_sources(inputs: TemplateInputs) -> str:
+    """Hash the contents of the sources of a template, independently of their location."""
+    digests = []
+    for filename in inputs.sources:
+        with open(filename, "rb") as source:
+            digests.append(hashlib.sha256(source.read()).hexdigest())
+    return hashlib.sha256("".join(sorted(digests)).encode("ascii")).hexdigest()
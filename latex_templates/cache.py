@@ -0,0 +1,316 @@
+"""
+Persistent caches shared by all invocations of ``latex-templates``.
+
+All caches live under a single base directory, which is taken from the
+``LATEX_TEMPLATE_CACHE_DIR`` variable or defaults to ``latex-templates`` inside
+the XDG cache directory (usually ``~/.cache/latex-templates``).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, List, NamedTuple, Optional, Union
+
+__all__ = [
+    "CacheInfo",
+    "PdfCache",
+    "cached_template_names",
+    "clear_directory",
+    "default_cache_dir",
+    "directory_info",
+    "evict_lru",
+]
+
+CACHE_DIR_ENV_VAR = "LATEX_TEMPLATE_CACHE_DIR"
+
+BYTECODE_SUBDIR = "jinja"
+DEFAULT_BYTECODE_CACHE_SIZE = 64 * 1024 * 1024
+
+PDF_SUBDIR = "pdf"
+DEFAULT_PDF_CACHE_SIZE = 512 * 1024 * 1024
+
+TEMPLATE_INDEX_FILE = "templates.json"
+
+
+def default_cache_dir() -> Path:
+    """Obtain the base directory for persistent caches."""
+    if os.environ.get(CACHE_DIR_ENV_VAR):
+        return Path(os.environ[CACHE_DIR_ENV_VAR])
+
+    xdg_cache = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(xdg_cache) / "latex-templates"
+
+
+class CacheInfo(NamedTuple):
+    directory: Path
+    entries: int
+    total_bytes: int
+
+
+def _cache_files(directory: Path) -> Iterable[os.DirEntry]:
+    try:
+        with os.scandir(str(directory)) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    yield entry
+    except FileNotFoundError:
+        return
+
+
+def directory_info(directory: Union[str, Path]) -> CacheInfo:
+    """Count the top-level entries of a cache directory and the bytes stored in all of it."""
+    directory = Path(directory)
+    try:
+        entries = sum(1 for _ in directory.iterdir())
+    except FileNotFoundError:
+        return CacheInfo(directory, 0, 0)
+
+    total_bytes = 0
+    for root, _, files in os.walk(str(directory)):
+        for name in files:
+            try:
+                total_bytes += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return CacheInfo(directory, entries, total_bytes)
+
+
+def evict_lru(directory: Union[str, Path], max_bytes: int) -> int:
+    """Delete the least recently used files of a flat cache directory until it fits in ``max_bytes``.
+
+    Recency is given by the modification time, so caches should touch their
+    entries whenever they are used.
+
+    :return:
+    Number of removed files.
+    """
+    files = []
+    total_bytes = 0
+    for entry in _cache_files(Path(directory)):
+        stat = entry.stat(follow_symlinks=False)
+        files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total_bytes += stat.st_size
+
+    removed = 0
+    files.sort()
+    for _, size, path in files:
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total_bytes -= size
+        removed += 1
+    return removed
+
+
+def clear_directory(directory: Union[str, Path]):
+    """Remove a cache directory and everything inside it."""
+    shutil.rmtree(str(directory), ignore_errors=True)
+
+
+def _write_atomically(path: Path, write: Callable[[BinaryIO], None]):
+    """Write a file through a temporary file, so that readers never see it partially written."""
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            write(out)
+        os.replace(tmp_path, str(path))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def cached_template_names(
+    template_path: Iterable[Path],
+    scan: Callable[[Path], List[str]],
+    index_file: Union[str, Path],
+) -> List[str]:
+    """List the templates in the given directories, reusing the results of previous scans.
+
+    The templates found in each directory are stored in ``index_file``, along
+    with the modification times of the directory and of its subdirectories.  A
+    directory is only scanned again (with ``scan``) when any of them changes,
+    i.e. when entries are added, removed or renamed in it or in one of its
+    subdirectories (such as the files marking a subdirectory as a template).
+    """
+    index_file = Path(index_file)
+    try:
+        with open(str(index_file)) as index:
+            cached = json.load(index)
+    except (OSError, ValueError):
+        cached = {}
+
+    updated, names = {}, []
+    for directory in template_path:
+        mtimes = _directory_mtimes(directory)
+        if mtimes is None:
+            continue
+
+        key = os.path.abspath(str(directory))
+        entry = cached.get(key)
+        if not isinstance(entry, dict) or entry.get("mtimes") != mtimes:
+            entry = {"mtimes": mtimes, "templates": scan(Path(directory))}
+        updated[key] = entry
+        names.extend(entry["templates"])
+
+    if updated != cached:
+        try:
+            index_file.parent.mkdir(parents=True, exist_ok=True)
+            content = json.dumps(updated).encode("utf-8")
+            _write_atomically(index_file, lambda out: out.write(content))
+        except OSError:
+            pass
+    return names
+
+
+def _directory_mtimes(directory: Union[str, Path]) -> Optional[Dict[str, int]]:
+    """Collect the modification times of a directory (keyed by "") and of its subdirectories."""
+    try:
+        mtimes = {"": os.stat(str(directory)).st_mtime_ns}
+        with os.scandir(str(directory)) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    mtimes[entry.name] = entry.stat().st_mtime_ns
+    except OSError:
+        return None
+    return mtimes
+
+
+def tree_digest(
+    directory: Union[str, Path],
+    command: List[str],
+    files: Optional[Iterable[Union[str, Path]]] = None,
+) -> str:
+    """Hash the paths and contents of files in a directory, together with a command line.
+
+    If ``files`` is given, only those paths (relative to the directory) are
+    hashed, otherwise all files in the directory are.
+    """
+    directory = Path(directory)
+    digest = hashlib.sha256()
+    digest.update(json.dumps(command).encode("utf-8"))
+
+    if files is None:
+        files = (
+            path.relative_to(directory)
+            for path in directory.rglob("*")
+            if path.is_file()
+        )
+    files = sorted(set(Path(path).as_posix() for path in files))
+    for relative_path in files:
+        digest.update(b"\0" + relative_path.encode("utf-8") + b"\0")
+        with open(str(directory / relative_path), "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def recorded_inputs(fls_file: Path, build_dir: Path) -> List[Path]:
+    """List the input files recorded by LaTeX (with ``-recorder``) that lie outside the build directory."""
+    build_dir = build_dir.resolve()
+    cwd = build_dir
+    inputs = []
+    try:
+        with open(str(fls_file), errors="replace") as fls:
+            for line in fls:
+                kind, _, path = line.rstrip("\n").partition(" ")
+                if kind == "PWD":
+                    cwd = Path(path)
+                elif kind == "INPUT":
+                    input_path = (cwd / path).resolve()
+                    if build_dir not in input_path.parents:
+                        inputs.append(input_path)
+    except FileNotFoundError:
+        pass
+    return sorted(set(inputs))
+
+
+class PdfCache:
+    """
+    Content-addressed cache of compiled PDFs.
+
+    Each entry is keyed on the hash of a generated project (see ``tree_digest``)
+    and stores the resulting PDF, along with the signatures of the files read by
+    LaTeX from outside the project (e.g. included PDFs), so that changes to them
+    also invalidate the entry.  Whenever the total size exceeds ``max_bytes``,
+    the least recently used entries are removed.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path, None] = None,
+        max_bytes: int = DEFAULT_PDF_CACHE_SIZE,
+    ):
+        if directory is None:
+            directory = default_cache_dir() / PDF_SUBDIR
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def key(
+        self,
+        build_dir: Union[str, Path],
+        command: List[str],
+        files: Optional[Iterable[Union[str, Path]]] = None,
+    ) -> str:
+        return tree_digest(build_dir, command, files)
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Obtain the cached PDF for the given key, if it exists and is still valid."""
+        pdf, deps = self.__entry_files(key)
+        try:
+            with open(str(deps)) as deps_file:
+                signatures = json.load(deps_file)
+        except (OSError, ValueError):
+            return None
+
+        if not pdf.is_file() or signatures != self.__signatures(signatures.keys()):
+            return None
+
+        for path in (pdf, deps):
+            try:
+                os.utime(str(path))
+            except OSError:
+                pass
+        return pdf
+
+    def store(self, key: str, pdf: Path, build_dir: Path, main_file: Path) -> Path:
+        """Copy a freshly compiled PDF into the cache, returning the path of the cached copy."""
+        cached_pdf, deps = self.__entry_files(key)
+        fls_file = (build_dir / main_file).with_suffix(".fls")
+        inputs = recorded_inputs(fls_file, build_dir)
+
+        def copy_pdf(out):
+            with open(str(pdf), "rb") as source:
+                shutil.copyfileobj(source, out)
+
+        _write_atomically(cached_pdf, copy_pdf)
+        signatures = self.__signatures(str(path) for path in inputs)
+        _write_atomically(
+            deps, lambda out: out.write(json.dumps(signatures).encode("utf-8"))
+        )
+
+        evict_lru(self.directory, self.max_bytes)
+        return cached_pdf
+
+    def info(self) -> CacheInfo:
+        return directory_info(self.directory)
+
+    def __entry_files(self, key: str):
+        return self.directory / f"{key}.pdf", self.directory / f"{key}.json"
+
+    @staticmethod
+    def __signatures(paths: Iterable[str]) -> Dict[str, Optional[List[int]]]:
+        signatures = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signatures[path] = [stat.st_mtime_ns, stat.st_size]
+            except OSError:
+                signatures[path] = None
+        return signatures
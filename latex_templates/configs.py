@@ -0,0 +1,303 @@
+"""
+Readers for configuration files, including batches of many configurations.
+
+A batch may be given as:
+  - a YAML file with multiple documents (separated by ``---``);
+  - a JSON Lines file (suffix ``.jsonl`` or ``.ndjson``), one config per line;
+  - a CSV file (suffix ``.csv``, or ``.tsv`` for tab-separated values), one
+    config per row, whose keys are given by the header (see ``iter_configs``);
+  - a directory, whose ``.yaml``, ``.yml`` and ``.json`` files are read in order.
+
+YAML is parsed with the safe loader, implemented in C by libyaml when PyYAML
+was built with it.  Tags constructing arbitrary Python objects are only
+supported after ``enable_tags`` is called (as done by the ``--import`` option),
+in which case the pure-Python ``FullLoader`` is used, since it is the loader
+that ``yaml.add_constructor`` registers custom constructors with.
+
+Batches are read incrementally, one config at a time, so that arbitrarily large
+batches can be processed in constant memory.
+
+Configs are merged with the defaults of a template by ``ConfigView``, which
+looks keys up in the config first and in the defaults second, merging nested
+mappings key by key.  The defaults are frozen once per template, so that all
+views can share them without copying.
+"""
+
+import json
+from collections.abc import Mapping
+from pathlib import Path
+from types import MappingProxyType
+from typing import IO, Any, Dict, Iterator, List, Optional, Union
+
+from . import timing
+
+__all__ = [
+    "ConfigView",
+    "InvalidConfigError",
+    "enable_tags",
+    "freeze",
+    "iter_configs",
+    "load_config",
+    "load_yaml",
+    "load_yaml_all",
+    "safe_loader",
+    "to_json",
+]
+
+JSON_LINES_SUFFIXES = {".jsonl", ".ndjson"}
+CSV_DELIMITERS = {".csv": ",", ".tsv": "\t"}
+CONFIG_SUFFIXES = {".yaml", ".yml", ".json"}
+
+
+class InvalidConfigError(ValueError):
+    """A config cannot be read, or does not conform to the schema of its template."""
+
+    def __init__(self, errors: List[str], source: Optional[str] = None):
+        self.errors = errors
+        self.source = source
+        heading = "Invalid config" if source is None else f"Invalid config {source}"
+        super().__init__("\n  ".join([f"{heading}:"] + errors))
+
+
+_tags_enabled = False
+
+
+def enable_tags(enabled: bool = True):
+    """Allow YAML tags that construct Python objects, including those registered by imported modules."""
+    global _tags_enabled
+    _tags_enabled = enabled
+
+
+def safe_loader() -> type:
+    """The fastest available loader that only constructs plain data."""
+    import yaml
+
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _loader() -> type:
+    import yaml
+
+    return yaml.FullLoader if _tags_enabled else safe_loader()
+
+
+def load_yaml(stream: Union[str, IO]) -> Any:
+    """Parse a single YAML document, e.g. a config, a default config or a rendered contents template."""
+    import yaml
+
+    return yaml.load(stream, Loader=_loader())
+
+
+def load_yaml_all(stream: Union[str, IO]) -> Iterator[Any]:
+    """Lazily parse all documents of a YAML stream."""
+    import yaml
+
+    return yaml.load_all(stream, Loader=_loader())
+
+
+def load_config(path: Union[str, Path]) -> dict:
+    """Load a single configuration file, setting its ``cwd`` to the containing directory."""
+    path = Path(path)
+    with timing.span("load-config", path), open(str(path)) as config_file:
+        config = load_yaml(config_file) or {}
+    config["cwd"] = path.resolve().parent
+    return config
+
+
+def iter_configs(
+    source: Union[str, Path], columns: Optional[Dict[str, str]] = None
+) -> Iterator[dict]:
+    """Iterate over all configurations of a batch, reading them lazily.
+
+    Each config receives a ``cwd`` entry with the directory of the file it was
+    read from, unless it already defines one.
+
+    The values of CSV files are strings, keyed by the column names of the header
+    unless ``columns`` maps them to other keys.  Keys are split at dots into
+    nested mappings, and into lists where the parts are indices, so that columns
+    ``sender.name``, ``toaddr.0`` and ``toaddr.1`` give
+    ``{"sender": {"name": ...}, "toaddr": [..., ...]}``.  Empty cells are left
+    out so that the defaults apply, as are columns mapped to an empty key.
+
+    :param source:
+    Batch file or directory of config files.
+
+    :param columns:
+    Keys for the columns of CSV files, by column name.
+
+    :raise:
+    InvalidConfigError when a document is not a mapping, or the columns of a
+    CSV file do not fit together (e.g. ``toaddr.0`` and ``toaddr.2`` without
+    ``toaddr.1``).
+    """
+    source = Path(source)
+    if source.is_dir():
+        for path in sorted(source.iterdir()):
+            if path.suffix in CONFIG_SUFFIXES and path.is_file():
+                yield from _iter_file(path)
+    elif source.suffix in CSV_DELIMITERS:
+        yield from _iter_csv(source, columns or {})
+    else:
+        yield from _iter_file(source)
+
+
+def _iter_file(path: Path) -> Iterator[dict]:
+    cwd = path.resolve().parent
+    with open(str(path)) as config_file:
+        if path.suffix in JSON_LINES_SUFFIXES:
+            documents = (json.loads(line) for line in config_file if line.strip())
+        else:
+            documents = load_yaml_all(config_file)
+
+        for index, config in enumerate(documents):
+            if config is None:
+                continue
+            if not isinstance(config, dict):
+                raise InvalidConfigError(
+                    [f"expected a mapping, found {config!r}"],
+                    f"#{index} in {path}",
+                )
+            config.setdefault("cwd", cwd)
+            yield config
+
+
+def _iter_csv(path: Path, columns: Dict[str, str]) -> Iterator[dict]:
+    import csv
+
+    cwd = path.resolve().parent
+    # utf-8-sig skips the byte order mark written by some spreadsheet programs
+    with open(str(path), newline="", encoding="utf-8-sig") as csv_file:
+        reader = csv.DictReader(csv_file, delimiter=CSV_DELIMITERS[path.suffix])
+        header = reader.fieldnames or []
+        unknown = set(columns) - set(header)
+        if unknown:
+            raise InvalidConfigError(
+                [
+                    f"unknown columns {', '.join(sorted(unknown))}, "
+                    f"expected one of {', '.join(header)}"
+                ],
+                f"in the header of {path}",
+            )
+        keys = [(column, columns.get(column, column).split(".")) for column in header]
+
+        for row in reader:
+            source = f"on line {reader.line_num} of {path}"
+            if None in row:
+                raise InvalidConfigError(["too many fields"], source)
+            config: Dict[str, Any] = {}
+            for column, key in keys:
+                value = row[column]
+                if key != [""] and value:
+                    _set_nested(config, key, value, column, source)
+            config = {
+                key: _index_lists(value, key, source) for key, value in config.items()
+            }
+            config.setdefault("cwd", cwd)
+            yield config
+
+
+def _set_nested(config: dict, key: list, value: str, column: str, source: str):
+    conflict = f"column '{column}' conflicts with another column"
+    node = config
+    for part in key[:-1]:
+        node = node.setdefault(part, {})
+        if not isinstance(node, dict):
+            raise InvalidConfigError([conflict], source)
+    if key[-1] in node:
+        raise InvalidConfigError([conflict], source)
+    node[key[-1]] = value
+
+
+def _index_lists(node: Any, key: str, source: str) -> Any:
+    """Turn the mappings whose keys are all indices into lists, ordered by index.
+
+    :raise:
+    InvalidConfigError when the indices of a list are not consecutive from 0.
+    """
+    if not isinstance(node, dict):
+        return node
+    if node and all(part.isdigit() for part in node):
+        indices = sorted(node, key=int)
+        if [int(index) for index in indices] != list(range(len(indices))):
+            raise InvalidConfigError(
+                [f"{key}: the indices {', '.join(indices)} are not consecutive from 0"],
+                source,
+            )
+        return [
+            _index_lists(node[index], f"{key}.{index}", source) for index in indices
+        ]
+    return {
+        part: _index_lists(value, f"{key}.{part}", source)
+        for part, value in node.items()
+    }
+
+
+def freeze(value: Any) -> Any:
+    """Make a read-only copy of a parsed config, turning mappings into mapping proxies and lists into tuples."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class ConfigView(Mapping):
+    """
+    Read-only view of a config merged with (frozen) defaults, without copying either of them.
+
+    Keys of the config take precedence over the defaults, except that mappings
+    found under the same key in both are merged recursively, so nested defaults
+    are preserved.  Nested views are created when first accessed, so building a
+    view is constant time and looking up a key costs the same as in a dict.
+    Use ``dict`` (or ``to_json``) to obtain an independent copy.
+    """
+
+    __slots__ = ("__config", "__defaults", "__nested")
+
+    def __init__(self, config: Mapping, defaults: Mapping):
+        self.__config = config
+        self.__defaults = defaults
+        self.__nested: Dict[Any, ConfigView] = {}
+
+    @property
+    def config(self) -> Mapping:
+        return self.__config
+
+    @property
+    def defaults(self) -> Mapping:
+        return self.__defaults
+
+    def __getitem__(self, key):
+        if key not in self.__config:
+            return self.__defaults[key]
+        value = self.__config[key]
+        if isinstance(value, Mapping) and isinstance(self.__defaults.get(key), Mapping):
+            nested = self.__nested.get(key)
+            if nested is None:
+                nested = self.__nested[key] = ConfigView(value, self.__defaults[key])
+            return nested
+        return value
+
+    def __contains__(self, key) -> bool:
+        return key in self.__config or key in self.__defaults
+
+    def __iter__(self):
+        yield from self.__config
+        for key in self.__defaults:
+            if key not in self.__config:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self.__config) + sum(
+            1 for key in self.__defaults if key not in self.__config
+        )
+
+    def __repr__(self) -> str:
+        return f"ConfigView({dict(self)!r})"
+
+
+def to_json(value: Any) -> Any:
+    """Fallback for ``json.dumps`` serializing config views and frozen defaults, and other objects by their ``repr``."""
+    if isinstance(value, Mapping):
+        return dict(value)
+    return repr(value)
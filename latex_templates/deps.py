@@ -0,0 +1,133 @@
+"""
+Tracking the inputs of each generated file, so that unchanged files need not be rendered again.
+
+The inputs of a file template are found by static analysis: all templates it
+(transitively) includes or imports, and all top-level variables referenced by
+any of them.  Templates whose includes are computed at runtime cannot be
+analysed, and are always rendered.
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+import jinja2
+import jinja2.meta
+from jinja2.loaders import split_template_path
+
+from .configs import to_json
+from .output import FileSignature, file_signature
+
+__all__ = ["DependencyTracker", "TemplateInputs", "fingerprint_inputs"]
+
+
+class TemplateInputs(NamedTuple):
+    """Inputs of a file template: its source files and the top-level config keys it reads."""
+
+    sources: Dict[str, FileSignature]
+    keys: FrozenSet[str]
+
+
+class _Analysis(NamedTuple):
+    signature: FileSignature
+    references: Optional[Tuple[str, ...]]  # None if some reference is dynamic
+    variables: FrozenSet[str]
+
+
+def fingerprint_inputs(inputs: Optional[TemplateInputs], config: dict) -> Optional[str]:
+    """Hash the given inputs of a template together with the config values it reads."""
+    if inputs is None:
+        return None
+
+    values = {key: config[key] for key in sorted(inputs.keys) if key in config}
+    try:
+        serialized = json.dumps(
+            [sorted(inputs.sources.items()), values],
+            sort_keys=True,
+            default=to_json,
+        )
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class DependencyTracker:
+    """
+    Computes fingerprints of the inputs of templates in a Jinja environment.
+
+    The analysis of each template source is memoized, and repeated only when
+    its modification time or size changes.  Only environments whose loader has
+    a ``searchpath`` (such as ``jinja2.FileSystemLoader``) are supported; for
+    other loaders no fingerprint is computed.
+    """
+
+    def __init__(self, env: jinja2.Environment):
+        self.__env = env
+        self.__analyses: Dict[str, _Analysis] = {}
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Find the file that the environment's loader would load for a template name."""
+        search_path = getattr(self.__env.loader, "searchpath", None)
+        if search_path is None:
+            return None
+        pieces = split_template_path(name)
+        for directory in search_path:
+            filename = posixpath.join(directory, *pieces)
+            if os.path.isfile(filename):
+                return os.path.normpath(filename)
+        return None
+
+    def inputs(self, name: str) -> Optional[TemplateInputs]:
+        """Collect the inputs of a template, or None if they cannot be determined statically."""
+        sources = {}
+        keys = set()
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            filename = self.resolve(current)
+            if filename is None:
+                return None
+            if filename in sources:
+                continue
+
+            analysis = self.__analyse(filename)
+            if analysis is None or analysis.references is None:
+                return None
+            sources[filename] = analysis.signature
+            keys.update(analysis.variables)
+            pending.extend(analysis.references)
+
+        return TemplateInputs(sources, frozenset(keys))
+
+    def fingerprint(self, name: str, config: dict) -> Optional[str]:
+        """Hash the inputs of a template rendered with the given config.
+
+        :return:
+        The fingerprint, or None if the inputs cannot be determined statically.
+        """
+        return fingerprint_inputs(self.inputs(name), config)
+
+    def __analyse(self, filename: str) -> Optional[_Analysis]:
+        signature = file_signature(filename)
+        if signature is None:
+            return None
+
+        analysis = self.__analyses.get(filename)
+        if analysis is not None and analysis.signature == signature:
+            return analysis
+
+        encoding = getattr(self.__env.loader, "encoding", "utf-8")
+        with open(filename, encoding=encoding) as source:
+            ast = self.__env.parse(source.read())
+
+        references = tuple(jinja2.meta.find_referenced_templates(ast))
+        if any(reference is None for reference in references):
+            references = None
+
+        analysis = _Analysis(
+            signature, references, frozenset(jinja2.meta.find_undeclared_variables(ast))
+        )
+        self.__analyses[filename] = analysis
+        return analysis
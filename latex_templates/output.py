@@ -0,0 +1,240 @@
+"""
+Writing generated projects to disk, touching only the files whose contents changed.
+
+Unchanged files keep their modification times, so that tools such as make and
+latexmk do not consider them outdated after regenerating a project.
+
+Raw files may be placed by one of the ``COPY_STRATEGIES``: ``copy`` duplicates
+the file, ``hardlink`` and ``symlink`` share it with the template (so editing
+the generated file in place also edits the template), and ``reflink`` creates a
+copy-on-write clone where the filesystem supports it.  Whenever a strategy is
+not possible (e.g. across filesystems), the file is copied instead.
+"""
+
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+__all__ = [
+    "COPY_STRATEGIES",
+    "GENERATION_MANIFEST",
+    "GenerationManifest",
+    "GenerationReport",
+    "content_digest",
+    "copy_if_changed",
+    "file_digest",
+    "file_signature",
+    "place_file",
+    "read_generation_manifest",
+    "remove_stale_files",
+    "write_generation_manifest",
+    "write_if_changed",
+]
+
+GENERATION_MANIFEST = ".latex-templates.json"
+
+FileSignature = Tuple[int, int]
+
+COPY_STRATEGIES = ("copy", "hardlink", "reflink", "symlink")
+FICLONE = 0x40049409  # Linux ioctl cloning a file on copy-on-write filesystems
+
+
+class GenerationReport(NamedTuple):
+    written: List[Path]
+    skipped: List[Path]
+    removed: List[Path]
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.written)} written, {len(self.skipped)} unchanged, "
+            f"{len(self.removed)} removed"
+        )
+
+
+def file_signature(path: Path) -> Optional[FileSignature]:
+    """Obtain a cheap signature (mtime and size) used to detect changes to a file."""
+    try:
+        stat = os.stat(str(path))
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def content_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(str(path), "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _has_size(path: Path, size: int) -> bool:
+    try:
+        return os.stat(str(path)).st_size == size
+    except OSError:
+        return False
+
+
+def _detach(path: Path):
+    """Remove a file that is shared with another path, so that writing it does not affect the other."""
+    try:
+        if path.is_symlink() or os.stat(str(path)).st_nlink > 1:
+            path.unlink()
+    except OSError:
+        pass
+
+
+def _is_same_file(src: Path, dst: Path) -> bool:
+    try:
+        return os.path.samefile(str(src), str(dst))
+    except OSError:
+        return False
+
+
+def write_if_changed(path: Path, content: bytes, only_changed: bool = True) -> bool:
+    """Write the given contents to a file, unless it already has exactly those contents.
+
+    A file shared with another path (by a hard or symbolic link) is replaced
+    instead of being written in place.
+
+    :return:
+    Whether the file was written.
+    """
+    if only_changed and _has_size(path, len(content)):
+        with open(str(path), "rb") as existing:
+            if existing.read() == content:
+                return False
+
+    _detach(path)
+    with open(str(path), "wb") as out:
+        out.write(content)
+    return True
+
+
+def _reflink(src: Path, dst: Path):
+    import fcntl
+
+    with open(str(src), "rb") as source, open(str(dst), "wb") as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+
+def place_file(src: Path, dst: Path, strategy: str = "copy") -> str:
+    """Place a copy of (or a link to) a file, falling back to copying it.
+
+    :return:
+    The strategy that was actually used.
+
+    :raise:
+    ValueError when the strategy is unknown.
+    """
+    if strategy not in COPY_STRATEGIES:
+        raise ValueError(
+            f"Unknown copy strategy '{strategy}', "
+            f"expected one of: {', '.join(COPY_STRATEGIES)}"
+        )
+
+    if strategy != "copy":
+        if os.path.lexists(str(dst)):
+            dst.unlink()
+        try:
+            if strategy == "hardlink":
+                os.link(str(src), str(dst))
+            elif strategy == "symlink":
+                os.symlink(os.path.abspath(str(src)), str(dst))
+            else:
+                _reflink(src, dst)
+            return strategy
+        except (OSError, ImportError):
+            if os.path.lexists(str(dst)):
+                dst.unlink()
+
+    _detach(dst)
+    shutil.copyfile(str(src), str(dst))
+    return "copy"
+
+
+def copy_if_changed(
+    src: Path, dst: Path, only_changed: bool = True, strategy: str = "copy"
+) -> bool:
+    """Copy (or link) a file, unless the destination already has exactly the same contents.
+
+    With the ``copy`` strategy, a destination linked to the source is replaced
+    by a copy.
+
+    :return:
+    Whether the file was copied.
+    """
+    if only_changed and _is_same_file(src, dst):
+        if strategy != "copy":
+            return False
+    elif (
+        only_changed
+        and _has_size(dst, os.stat(str(src)).st_size)
+        and filecmp.cmp(str(src), str(dst), shallow=False)
+    ):
+        return False
+
+    place_file(src, dst, strategy)
+    return True
+
+
+class GenerationManifest(NamedTuple):
+    """Record of the files generated into a directory.
+
+    files
+      Digest of the contents of each generated file, by target path
+    inputs
+      Description of the inputs of each generated file, by target path, with
+      the fields ``src``, ``raw``, ``fingerprint`` (of the template sources and
+      config values used), ``strategy`` (how raw files were placed) and
+      ``output`` (signature of the generated file)
+    """
+
+    files: Dict[str, str]
+    inputs: Dict[str, dict]
+
+
+def read_generation_manifest(target_dir: Path) -> GenerationManifest:
+    """Read the record of the files previously generated into a directory."""
+    try:
+        with open(str(target_dir / GENERATION_MANIFEST)) as manifest:
+            content = json.load(manifest)
+        return GenerationManifest(
+            dict(content.get("files", {})), dict(content.get("inputs", {}))
+        )
+    except (OSError, ValueError, AttributeError, TypeError):
+        return GenerationManifest({}, {})
+
+
+def write_generation_manifest(target_dir: Path, manifest: GenerationManifest):
+    content = json.dumps(manifest._asdict(), indent=2, sort_keys=True) + "\n"
+    write_if_changed(target_dir / GENERATION_MANIFEST, content.encode("utf-8"))
+
+
+def remove_stale_files(
+    target_dir: Path, previous: Dict[str, str], current: Dict[str, str]
+) -> List[Path]:
+    """Remove previously generated files that are no longer generated.
+
+    Files modified since they were generated are kept.
+    """
+    removed = []
+    for tgt, digest in previous.items():
+        if tgt in current:
+            continue
+        path = target_dir / tgt
+        try:
+            if file_digest(path) == digest:
+                path.unlink()
+                removed.append(Path(tgt))
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,162 @@
+"""
+Index files describing all templates in a template directory.
+
+Each directory of the template path may contain an index file, generated by
+``latex-templates reindex``, recording for each template its path, modification
+time, the digest of its default configuration, its main file and its
+description.  The index is only trusted while the modification time of the
+directory matches the recorded one, i.e. until templates are added, removed or
+renamed.  Files added to or removed from a template modify the template
+directory instead, which is detected by ``is_current``.
+
+The description of a template is given by the line comments (starting with
+``%%#``) at the beginning of its contents template.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple, Union
+
+__all__ = [
+    "INDEX_FILE",
+    "TemplateRecord",
+    "build_index",
+    "is_current",
+    "read_description",
+    "read_index",
+    "write_index",
+]
+
+INDEX_FILE = ".latex-templates-index.json"
+INDEX_VERSION = 1
+DESCRIPTION_PREFIX = "%%#"
+
+
+class TemplateRecord(NamedTuple):
+    name: str
+    path: Path
+    mtime: int
+    default_conf_digest: str
+    main_file: Optional[str]
+    description: str
+
+
+def read_description(contents_file: Path) -> str:
+    """Read the description of a template from the leading line comments of its contents template."""
+    lines = []
+    try:
+        with open(str(contents_file)) as contents:
+            for line in contents:
+                if not line.startswith(DESCRIPTION_PREFIX):
+                    break
+                lines.append(line[len(DESCRIPTION_PREFIX) :].strip())
+    except OSError:
+        pass
+    return " ".join(line for line in lines if line)
+
+
+_loaded: Dict[str, Tuple[int, Optional[Dict[str, TemplateRecord]]]] = {}
+
+
+def read_index(directory: Union[str, Path]) -> Optional[Dict[str, TemplateRecord]]:
+    """Read the index of a template directory, or None if it is missing or outdated.
+
+    Indices are memoized for as long as the directory is not modified.
+    """
+    directory = Path(directory)
+    try:
+        mtime = os.stat(str(directory)).st_mtime_ns
+    except OSError:
+        return None
+
+    key = os.path.abspath(str(directory))
+    if key in _loaded and _loaded[key][0] == mtime:
+        return _loaded[key][1]
+
+    records = None
+    try:
+        with open(str(directory / INDEX_FILE)) as index_file:
+            index = json.load(index_file)
+        if index.get("version") == INDEX_VERSION and index.get("mtime") == mtime:
+            records = {
+                name: TemplateRecord(
+                    name,
+                    directory / entry["path"],
+                    entry["mtime"],
+                    entry["default_conf_digest"],
+                    entry.get("main_file"),
+                    entry.get("description", ""),
+                )
+                for name, entry in index["templates"].items()
+            }
+    except (OSError, ValueError, KeyError, AttributeError, TypeError):
+        records = None
+
+    _loaded[key] = (mtime, records)
+    return records
+
+
+def is_current(record: TemplateRecord) -> bool:
+    """Check whether the template directory was not modified since the record was written."""
+    try:
+        return os.stat(str(record.path)).st_mtime_ns == record.mtime
+    except OSError:
+        return False
+
+
+def build_index(
+    directory: Union[str, Path], lib_path: Iterable[Path]
+) -> Dict[str, TemplateRecord]:
+    """Describe all templates in a directory, rendering their contents with the defaults to find the main file."""
+    from . import ProjectTemplate
+
+    directory = Path(directory)
+    lib_path = list(lib_path)
+    records = {}
+    for name in sorted(ProjectTemplate.find_all([directory])):
+        template = ProjectTemplate(directory / name, lib_path)
+        with open(str(template.default_conf_file), "rb") as default_conf:
+            digest = hashlib.sha256(default_conf.read()).hexdigest()
+        try:
+            main_file = template.get_main_latex_file({})
+        except Exception:
+            main_file = None
+
+        records[name] = TemplateRecord(
+            name,
+            template.root_dir,
+            os.stat(str(template.root_dir)).st_mtime_ns,
+            digest,
+            None if main_file is None else main_file.src.as_posix(),
+            read_description(template.contents_file),
+        )
+    return records
+
+
+def write_index(directory: Union[str, Path], records: Dict[str, TemplateRecord]):
+    """Write the index of a template directory.
+
+    Creating the index file modifies the directory, so the file is written
+    twice: the second time in place, recording the final modification time.
+    """
+    directory = Path(directory)
+    index_path = directory / INDEX_FILE
+    templates = {
+        name: {
+            "path": record.path.relative_to(directory).as_posix(),
+            "mtime": record.mtime,
+            "default_conf_digest": record.default_conf_digest,
+            "main_file": record.main_file,
+            "description": record.description,
+        }
+        for name, record in records.items()
+    }
+
+    for _ in range(2):
+        mtime = os.stat(str(directory)).st_mtime_ns
+        content = {"version": INDEX_VERSION, "mtime": mtime, "templates": templates}
+        with open(str(index_path), "w") as index_file:
+            json.dump(content, index_file, indent=2, sort_keys=True)
+            index_file.write("\n")
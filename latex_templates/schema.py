@@ -0,0 +1,283 @@
+"""
+Validation of configs against the schema of a template, before anything is rendered.
+
+A template may describe its config in a file ``schema.yaml``, next to
+``default-conf.yaml``.  The file maps each key of the config to its rules:
+
+type
+  ``string``, ``integer``, ``number``, ``boolean``, ``scalar`` (any of these),
+  ``list``, ``mapping`` or ``any`` (the default), or a list of them
+required
+  Whether the key must be given by the config or the defaults
+nullable
+  Whether the value may be null
+enum
+  List of the allowed values
+pattern
+  Regular expression that strings must match completely
+items
+  Rules for the items of a list
+keys
+  Rules for the keys of a mapping (if the type allows anything else, e.g.
+  ``[string, mapping]``, the keys are only checked for mappings)
+additional
+  Whether a mapping may contain keys without rules (true by default)
+
+Rules consisting of a type only may be abbreviated to its name, e.g.
+``lang: string``.  Templates without a schema file are validated against a
+schema derived from their defaults, which only requires each overridden value to
+have the same shape as its default: a mapping, a list or a scalar.
+
+Schemas are compiled into nested closures, so that validating a config costs
+little more than looking up its values.  Configs merged with the defaults by
+``ConfigView`` are validated incrementally against derived schemas, by checking
+only the values that the config overrides.
+"""
+
+import datetime
+import re
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .configs import ConfigView, InvalidConfigError, load_yaml
+
+__all__ = ["InvalidConfigError", "Schema"]
+
+Check = Callable[[Any, Tuple, List[str]], None]
+
+SCALARS = (str, int, float, bool, datetime.date)
+
+TYPES: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float))
+    and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "scalar": lambda value: isinstance(value, SCALARS),
+    "list": lambda value: isinstance(value, (list, tuple)),
+    "mapping": lambda value: isinstance(value, Mapping),
+    "any": lambda value: True,
+}
+
+RULES = {
+    "type",
+    "required",
+    "nullable",
+    "enum",
+    "pattern",
+    "items",
+    "keys",
+    "additional",
+}
+
+
+class Schema:
+    """
+    Compiled schema, validating configs given as mappings.
+
+    :param rules:
+    Rules for each top-level key of the config, in the format of ``schema.yaml``.
+
+    :param incremental:
+    Whether the defaults are known to conform to the schema, so that only the
+    values overridden by a ``ConfigView`` need to be checked.
+    """
+
+    def __init__(self, rules: Mapping, *, incremental: bool = False):
+        self.incremental = incremental
+        self.__check = self.__compile_mapping(
+            {"keys": rules}, "schema", lambda *_: True
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Schema":
+        with open(str(path)) as schema_file:
+            rules = load_yaml(schema_file) or {}
+        if not isinstance(rules, Mapping):
+            raise ValueError(f"Invalid schema {path}: expected a mapping of keys")
+        try:
+            return cls(rules)
+        except ValueError as e:
+            raise ValueError(f"Invalid schema {path}: {e}") from e
+
+    @classmethod
+    def from_defaults(cls, defaults: Mapping) -> "Schema":
+        """Derive a schema requiring the values of a config to have the shape of their defaults."""
+        return cls(
+            {key: _derive(value) for key, value in defaults.items()}, incremental=True
+        )
+
+    def errors(self, config: Mapping) -> List[str]:
+        """Check a config, returning a description of each violation of the schema."""
+        errors: List[str] = []
+        self.__check(config, (), errors)
+        return errors
+
+    def validate(self, config: Mapping, source: Optional[str] = None):
+        """Check a config, raising an ``InvalidConfigError`` if it violates the schema."""
+        errors = self.errors(config)
+        if errors:
+            raise InvalidConfigError(errors, source)
+
+    def __compile(self, rule: Any, where: str) -> Check:
+        if isinstance(rule, (str, list)):
+            rule = {"type": rule}
+        elif rule is None:
+            rule = {}
+        if not isinstance(rule, Mapping):
+            raise ValueError(f"Invalid rule for {where}: {rule!r}")
+        unknown = set(rule) - RULES
+        if unknown:
+            raise ValueError(f"Unknown rules for {where}: {', '.join(sorted(unknown))}")
+
+        is_mapping = "keys" in rule or "additional" in rule
+        types = rule.get("type", "mapping" if is_mapping else "any")
+        types = [types] if isinstance(types, str) else list(types)
+        for name in types:
+            if name not in TYPES:
+                raise ValueError(f"Unknown type '{name}' for {where}")
+        predicates = [TYPES[name] for name in types]
+        expected = " or ".join(types)
+        nullable = rule.get("nullable", False) or "any" in types
+
+        if len(predicates) == 1:
+            (check_type,) = predicates
+        else:
+
+            def check_type(value: Any) -> bool:
+                return any(predicate(value) for predicate in predicates)
+
+        if is_mapping:
+            return self.__compile_mapping(rule, where, check_type, nullable, expected)
+
+        checks = []
+        if "enum" in rule:
+            allowed = list(rule["enum"])
+
+            def check_enum(value, path, errors):
+                if value not in allowed:
+                    errors.append(f"{_format(path)}: {value!r} is not one of {allowed}")
+
+            checks.append(check_enum)
+        if "pattern" in rule:
+            regex = re.compile(rule["pattern"])
+
+            def check_pattern(value, path, errors):
+                if isinstance(value, str) and regex.fullmatch(value) is None:
+                    errors.append(
+                        f"{_format(path)}: {value!r} does not match '{regex.pattern}'"
+                    )
+
+            checks.append(check_pattern)
+        if "items" in rule:
+            check_item = self.__compile(rule["items"], f"the items of {where}")
+
+            def check_items(value, path, errors):
+                if isinstance(value, (list, tuple)):
+                    for index, item in enumerate(value):
+                        check_item(item, path + (index,), errors)
+
+            checks.append(check_items)
+
+        def check(value, path, errors):
+            if value is None:
+                if not nullable:
+                    errors.append(f"{_format(path)}: expected {expected}, found null")
+            elif not check_type(value):
+                errors.append(
+                    f"{_format(path)}: expected {expected}, found {_describe(value)}"
+                )
+            else:
+                for nested in checks:
+                    nested(value, path, errors)
+
+        return check
+
+    def __compile_mapping(
+        self,
+        rule: Mapping,
+        where: str,
+        check_type: Callable[[Any], bool],
+        nullable: bool = False,
+        expected: str = "mapping",
+    ) -> Check:
+        keys = rule.get("keys") or {}
+        if not isinstance(keys, Mapping):
+            raise ValueError(f"Invalid keys for {where}: {keys!r}")
+        checks = {
+            key: self.__compile(value, f"'{key}' in {where}")
+            for key, value in keys.items()
+        }
+        required = [
+            key
+            for key, value in keys.items()
+            if isinstance(value, Mapping) and value.get("required", False)
+        ]
+        additional = rule.get("additional", True)
+        incremental = self.incremental
+
+        def check(value, path, errors):
+            if value is None:
+                if not nullable:
+                    errors.append(f"{_format(path)}: expected {expected}, found null")
+                return
+            if not check_type(value):
+                errors.append(
+                    f"{_format(path)}: expected {expected}, found {_describe(value)}"
+                )
+                return
+            if not isinstance(value, Mapping):
+                return
+            for key in required:
+                if key not in value:
+                    errors.append(f"{_format(path + (key,))}: is required")
+            if incremental and isinstance(value, ConfigView):
+                overridden = value.config
+                for key in overridden:
+                    if key in checks:
+                        checks[key](value[key], path + (key,), errors)
+                    elif not additional:
+                        errors.append(f"{_format(path + (key,))}: unknown key")
+            elif additional:
+                for key, check_key in checks.items():
+                    if key in value:
+                        check_key(value[key], path + (key,), errors)
+            else:
+                for key in value:
+                    if key in checks:
+                        checks[key](value[key], path + (key,), errors)
+                    else:
+                        errors.append(f"{_format(path + (key,))}: unknown key")
+
+        return check
+
+
+def _derive(value: Any) -> Any:
+    """Derive the rules for a value from its default."""
+    if isinstance(value, Mapping):
+        return {"keys": {key: _derive(item) for key, item in value.items()}}
+    if isinstance(value, (list, tuple)):
+        items = [_derive(item) for item in value]
+        if items and all(item == items[0] for item in items):
+            return {"type": "list", "nullable": True, "items": items[0]}
+        return {"type": "list", "nullable": True}
+    if isinstance(value, SCALARS):
+        return {"type": "scalar", "nullable": True}
+    return None
+
+
+def _format(path: Tuple) -> str:
+    if not path:
+        return "config"
+    return "".join(
+        f"[{part}]" if isinstance(part, int) else f".{part}" for part in path
+    ).lstrip(".")
+
+
+def _describe(value: Any) -> str:
+    if isinstance(value, Mapping):
+        return "mapping"
+    if isinstance(value, (list, tuple)):
+        return "list"
+    return f"{type(value).__name__} {value!r}"
@@ -0,0 +1,374 @@
+"""
+Long-running render server, keeping templates and their compiled sources warm.
+
+The server speaks HTTP, either on a local TCP port or on a Unix socket:
+
+``GET /templates``
+  JSON list of the available templates.
+``GET /metrics``
+  JSON object with the number of queued and running builds, request counters
+  and latency statistics.
+``POST /templates/NAME/project``
+  Generate a project from the config in the request body (YAML or JSON) and
+  return it as a gzip-compressed tarball.
+``POST /templates/NAME/pdf``
+  Generate and compile a project, returning the PDF.  At most ``jobs``
+  compilations run at once, further requests wait in a queue.
+
+Configs received over the network are loaded with the safe YAML loader, and
+their ``cwd`` defaults to the working directory of the server.
+"""
+
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Deque, Dict, List, NamedTuple, Optional, Union
+
+from . import (
+    InvalidConfigError,
+    ProjectTemplate,
+    ProjectTemplateNotFoundError,
+    SearchPath,
+    enumerate_templates,
+    open_build_pool,
+    open_bytecode_cache,
+    open_pdf_cache,
+)
+from .configs import safe_loader
+
+__all__ = ["RenderError", "RenderService", "ServerMetrics", "serve"]
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8642
+MAX_CONFIG_SIZE = 16 * 1024 * 1024
+LATENCY_WINDOW = 1000
+
+
+class RenderError(Exception):
+    """Failure of a request, reported to the client with the given HTTP status."""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _Latencies(NamedTuple):
+    count: int
+    mean: float
+    p50: float
+    p95: float
+    max: float
+
+
+class ServerMetrics:
+    """Thread-safe counters and latency statistics of a render server."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.__lock = threading.Lock()
+        self.__started = time.monotonic()
+        self.__queued = 0
+        self.__running = 0
+        self.__requests: Dict[str, int] = {}
+        self.__errors: Dict[str, int] = {}
+        self.__latencies: Dict[str, Deque[float]] = {}
+        self.__window = window
+
+    def enqueue(self):
+        with self.__lock:
+            self.__queued += 1
+
+    def start(self):
+        with self.__lock:
+            self.__queued -= 1
+            self.__running += 1
+
+    def stop(self):
+        with self.__lock:
+            self.__running -= 1
+
+    def record(self, kind: str, seconds: float, ok: bool):
+        with self.__lock:
+            self.__requests[kind] = self.__requests.get(kind, 0) + 1
+            if not ok:
+                self.__errors[kind] = self.__errors.get(kind, 0) + 1
+            latencies = self.__latencies.setdefault(kind, deque(maxlen=self.__window))
+            latencies.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {
+                "uptime": time.monotonic() - self.__started,
+                "queue_depth": self.__queued,
+                "running_builds": self.__running,
+                "requests": dict(self.__requests),
+                "errors": dict(self.__errors),
+                "latency_ms": {
+                    kind: _summarize(latencies)._asdict()
+                    for kind, latencies in self.__latencies.items()
+                },
+            }
+
+
+def _summarize(latencies: Deque[float]) -> _Latencies:
+    ordered = sorted(latencies)
+    if not ordered:
+        return _Latencies(0, 0.0, 0.0, 0.0, 0.0)
+
+    def percentile(p: float) -> float:
+        return 1000 * ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return _Latencies(
+        len(ordered),
+        1000 * sum(ordered) / len(ordered),
+        percentile(0.5),
+        percentile(0.95),
+        1000 * ordered[-1],
+    )
+
+
+class RenderService:
+    """
+    Renders and compiles projects on behalf of the server, independently of HTTP.
+
+    Templates are looked up once and kept, together with their Jinja environment,
+    for the lifetime of the service.  Compilations are bounded by ``jobs`` and
+    use the persistent caches of the command line, if a cache directory is given.
+    """
+
+    def __init__(
+        self,
+        template_path: SearchPath,
+        lib_path: SearchPath,
+        *,
+        cache_dir: Optional[Path] = None,
+        jobs: Optional[int] = None,
+        timeout: Optional[float] = None,
+        verbose: bool = False,
+    ):
+        self.template_path = list(template_path)
+        self.lib_path = list(lib_path)
+        self.timeout = timeout
+        self.verbose = verbose
+        self.metrics = ServerMetrics()
+
+        self.__cache_dir = cache_dir
+        self.__bytecode_cache = open_bytecode_cache(cache_dir, verbose)
+        self.__pdf_cache = open_pdf_cache(cache_dir, verbose)
+        self.__build_pool = open_build_pool(cache_dir, verbose)
+        self.__builds = threading.BoundedSemaphore(jobs or os.cpu_count() or 1)
+        self.__templates: Dict[str, ProjectTemplate] = {}
+        self.__templates_lock = threading.Lock()
+
+    def template_names(self) -> List[str]:
+        return sorted(
+            set(enumerate_templates(self.template_path, False, self.__cache_dir))
+        )
+
+    def template(self, name: str) -> ProjectTemplate:
+        """Find a template by name, reusing the instance from previous requests."""
+        if not name or name.startswith(".") or "/" in name or "\\" in name:
+            raise RenderError(HTTPStatus.NOT_FOUND, f'Invalid template name "{name}".')
+
+        with self.__templates_lock:
+            template = self.__templates.get(name)
+            if template is None:
+                try:
+                    template = ProjectTemplate.find(
+                        name,
+                        self.template_path,
+                        self.lib_path,
+                        bytecode_cache=self.__bytecode_cache,
+                    )
+                except ProjectTemplateNotFoundError as e:
+                    raise RenderError(HTTPStatus.NOT_FOUND, str(e))
+                self.__templates[name] = template
+            return template
+
+    def render_archive(self, name: str, config: dict) -> bytes:
+        """Generate a project into a gzip-compressed tarball, in memory."""
+        template = self.template(name)
+        buffer = io.BytesIO()
+        template.generate_to_archive(config, buffer, "tar.gz")
+        return buffer.getvalue()
+
+    def build_pdf(self, name: str, config: dict) -> bytes:
+        """Generate and compile a project, waiting for a free build worker."""
+        template = self.template(name)
+        self.metrics.enqueue()
+        with self.__builds:
+            self.metrics.start()
+            try:
+                with TemporaryDirectory() as output_dir:
+                    try:
+                        (result,) = template.compile_pdf_many(
+                            [config],
+                            output_dir=output_dir,
+                            jobs=1,
+                            timeout=self.timeout,
+                            pdf_cache=self.__pdf_cache,
+                            build_pool=self.__build_pool,
+                        )
+                    except ValueError as e:
+                        raise RenderError(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+
+                    if result.timed_out:
+                        raise RenderError(
+                            HTTPStatus.GATEWAY_TIMEOUT, result.log or "Build timed out."
+                        )
+                    elif not result.ok or result.pdf is None:
+                        raise RenderError(
+                            HTTPStatus.UNPROCESSABLE_ENTITY,
+                            result.log
+                            or f"latexmk failed with exit code {result.returncode}",
+                        )
+                    return result.pdf.read_bytes()
+            finally:
+                self.metrics.stop()
+
+
+def parse_config(body: bytes) -> dict:
+    """Load a config sent by a client, as YAML (or JSON, which is a subset of it)."""
+    import yaml
+
+    try:
+        config = yaml.load(body.decode("utf-8"), Loader=safe_loader()) or {}
+    except (UnicodeDecodeError, yaml.YAMLError) as e:
+        raise RenderError(HTTPStatus.BAD_REQUEST, f"Invalid config: {e}")
+    if not isinstance(config, dict):
+        raise RenderError(HTTPStatus.BAD_REQUEST, "The config must be a mapping.")
+    config.setdefault("cwd", Path.cwd())
+    return config
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    server_version = "latex-templates"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self) -> RenderService:
+        return self.server.service
+
+    def do_GET(self):
+        if self.path == "/templates":
+            self.__respond_json(self.service.template_names())
+        elif self.path == "/metrics":
+            self.__respond_json(self.service.metrics.snapshot())
+        else:
+            self.__respond_error(HTTPStatus.NOT_FOUND, "Not found.")
+
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "templates":
+            self.__respond_error(HTTPStatus.NOT_FOUND, "Not found.")
+            return
+        _, name, kind = parts
+        if kind == "project":
+            render, content_type = self.service.render_archive, "application/gzip"
+        elif kind == "pdf":
+            render, content_type = self.service.build_pdf, "application/pdf"
+        else:
+            self.__respond_error(HTTPStatus.NOT_FOUND, "Not found.")
+            return
+
+        start = time.perf_counter()
+        ok = False
+        try:
+            config = parse_config(self.__read_body())
+            body = render(name, config)
+            ok = True
+        except RenderError as e:
+            self.__respond_error(e.status, str(e))
+        except InvalidConfigError as e:
+            self.__respond_error(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+        except Exception as e:
+            self.__respond_error(
+                HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}"
+            )
+        else:
+            self.__respond(HTTPStatus.OK, content_type, body)
+        finally:
+            self.service.metrics.record(kind, time.perf_counter() - start, ok)
+
+    def address_string(self) -> str:
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return "unix"
+
+    def log_message(self, format, *args):
+        if self.service.verbose:
+            super().log_message(format, *args)
+
+    def __read_body(self) -> bytes:
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            raise RenderError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+        if length > MAX_CONFIG_SIZE:
+            raise RenderError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Config too large.")
+        return self.rfile.read(length)
+
+    def __respond_json(self, value):
+        body = (json.dumps(value, indent=2) + "\n").encode("utf-8")
+        self.__respond(HTTPStatus.OK, "application/json", body)
+
+    def __respond_error(self, status: HTTPStatus, message: str):
+        body = (message.rstrip("\n") + "\n").encode("utf-8")
+        self.__respond(status, "text/plain; charset=utf-8", body)
+
+    def __respond(self, status: HTTPStatus, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ThreadingUnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+def serve(
+    service: RenderService,
+    *,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    unix_socket: Union[str, Path, None] = None,
+):
+    """Serve render requests until interrupted, each in its own thread."""
+    if unix_socket is not None:
+        unix_socket = Path(unix_socket)
+        if unix_socket.is_socket():
+            unix_socket.unlink()
+        server = _ThreadingUnixHTTPServer(str(unix_socket), RenderRequestHandler)
+        address = str(unix_socket)
+    else:
+        server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+        address = "http://{}:{}".format(*server.server_address[:2])
+    server.service = service
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    print(f"Serving on {address}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if unix_socket is not None:
+            try:
+                unix_socket.unlink()
+            except OSError:
+                pass
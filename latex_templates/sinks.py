@@ -0,0 +1,208 @@
+"""
+Destinations for the files of generated projects.
+
+``ProjectTemplate.generate`` renders the files listed by the contents template
+one at a time and hands each of them to an output sink, which may write them to
+disk (``DiskSink``), keep them in memory (``MemorySink``) or pack them into an
+archive (``ArchiveSink``).
+"""
+
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Union
+
+from .output import (
+    COPY_STRATEGIES,
+    GenerationManifest,
+    content_digest,
+    copy_if_changed,
+    file_digest,
+    file_signature,
+    read_generation_manifest,
+    remove_stale_files,
+    write_generation_manifest,
+    write_if_changed,
+)
+
+__all__ = ["ArchiveSink", "DiskSink", "MemorySink", "OutputSink"]
+
+ENCODING = "utf-8"
+
+
+class OutputSink:
+    """
+    Base class of the destinations of generated projects.
+
+    The ``inputs`` passed for each file describe what it was generated from (see
+    ``GenerationManifest``), and are only computed for sinks that are
+    ``incremental``, i.e. that may keep files from a previous generation.
+    Sinks that are ``concurrent`` may receive several files at once from
+    different threads, but ``finish`` is only called after all of them.
+    """
+
+    incremental = False
+    concurrent = True
+
+    def keep(self, tgt: Path, inputs: dict) -> bool:
+        """Keep a file generated previously from the same inputs, instead of generating it again.
+
+        :return:
+        Whether the file was kept.
+        """
+        return False
+
+    def write(self, tgt: Path, chunks: Iterable[str], inputs: dict) -> bool:
+        """Write a rendered file, whose contents are given piecewise.
+
+        :return:
+        Whether the file was written.
+        """
+        raise NotImplementedError
+
+    def copy(self, tgt: Path, src: Path, inputs: dict) -> bool:
+        """Copy a raw file from the template.
+
+        :return:
+        Whether the file was copied.
+        """
+        raise NotImplementedError
+
+    def finish(self) -> List[Path]:
+        """Complete the generation, after all files were written.
+
+        :return:
+        Files from a previous generation that were removed.
+        """
+        return []
+
+
+class DiskSink(OutputSink):
+    """
+    Writes a project into a directory on disk, touching only the files whose contents changed.
+
+    The generated files are recorded in the directory's generation manifest, so
+    that files whose inputs did not change can be kept and files no longer part
+    of the project can be removed by the next generation.  Raw files are placed
+    with the given copy strategy (see ``latex_templates.output``).
+    """
+
+    incremental = True
+
+    def __init__(
+        self,
+        target_dir: Union[str, Path],
+        only_changed: bool = True,
+        copy_strategy: str = "copy",
+    ):
+        if copy_strategy not in COPY_STRATEGIES:
+            raise ValueError(f"Unknown copy strategy '{copy_strategy}'")
+        self.target_dir = Path(target_dir)
+        self.only_changed = only_changed
+        self.copy_strategy = copy_strategy
+        if not self.target_dir.exists():
+            self.target_dir.mkdir(parents=True)
+
+        self.__previous = read_generation_manifest(self.target_dir)
+        self.manifest = GenerationManifest({}, {})
+
+    def keep(self, tgt: Path, inputs: dict) -> bool:
+        key = tgt.as_posix()
+        inputs = self.__with_strategy(inputs)
+        if not self.only_changed or not self.__is_up_to_date(key, inputs):
+            return False
+        self.manifest.files[key] = self.__previous.files[key]
+        self.manifest.inputs[key] = self.__previous.inputs[key]
+        return True
+
+    def write(self, tgt: Path, chunks: Iterable[str], inputs: dict) -> bool:
+        path = self.__prepare(tgt)
+        content = "".join(chunks).encode(ENCODING)
+        self.manifest.files[tgt.as_posix()] = content_digest(content)
+        written = write_if_changed(path, content, self.only_changed)
+        self.__record(tgt, inputs)
+        return written
+
+    def copy(self, tgt: Path, src: Path, inputs: dict) -> bool:
+        path = self.__prepare(tgt)
+        self.manifest.files[tgt.as_posix()] = file_digest(src)
+        copied = copy_if_changed(src, path, self.only_changed, self.copy_strategy)
+        self.__record(tgt, self.__with_strategy(inputs))
+        return copied
+
+    def finish(self) -> List[Path]:
+        removed = remove_stale_files(
+            self.target_dir, self.__previous.files, self.manifest.files
+        )
+        write_generation_manifest(self.target_dir, self.manifest)
+        return removed
+
+    def __prepare(self, tgt: Path) -> Path:
+        path = self.target_dir / tgt
+        if not path.parent.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def __with_strategy(self, inputs: dict) -> dict:
+        """Add the copy strategy to the inputs of a raw file, so that changing it places the file again."""
+        if not inputs.get("raw"):
+            return inputs
+        return {**inputs, "strategy": self.copy_strategy}
+
+    def __record(self, tgt: Path, inputs: dict):
+        self.manifest.inputs[tgt.as_posix()] = {
+            **inputs,
+            "output": file_signature(self.target_dir / tgt),
+        }
+
+    def __is_up_to_date(self, key: str, inputs: dict) -> bool:
+        """Check whether a file was generated from the same inputs and left untouched since."""
+        if inputs["fingerprint"] is None or key not in self.__previous.files:
+            return False
+        recorded = self.__previous.inputs.get(key, {})
+        output = recorded.get("output")
+        return (
+            all(recorded.get(field) == value for field, value in inputs.items())
+            and output is not None
+            and file_signature(self.target_dir / key) == tuple(output)
+        )
+
+
+class MemorySink(OutputSink):
+    """Keeps the contents of a generated project in memory, by target path."""
+
+    def __init__(self):
+        self.files: Dict[Path, bytes] = {}
+
+    def write(self, tgt: Path, chunks: Iterable[str], inputs: dict) -> bool:
+        self.files[tgt] = "".join(chunks).encode(ENCODING)
+        return True
+
+    def copy(self, tgt: Path, src: Path, inputs: dict) -> bool:
+        self.files[tgt] = src.read_bytes()
+        return True
+
+
+class ArchiveSink(OutputSink):
+    """Streams a generated project into a zip or tar archive, which is completed by ``finish``."""
+
+    concurrent = False
+
+    def __init__(self, fileobj: BinaryIO, format: str = "zip"):
+        from .archive import ArchiveWriter
+
+        self.__archive = ArchiveWriter(fileobj, format)
+
+    def write(self, tgt: Path, chunks: Iterable[str], inputs: dict) -> bool:
+        self.__archive.add_chunks(tgt.as_posix(), chunks, ENCODING)
+        return True
+
+    def copy(self, tgt: Path, src: Path, inputs: dict) -> bool:
+        self.__archive.add_file(tgt.as_posix(), src)
+        return True
+
+    def finish(self) -> List[Path]:
+        self.close()
+        return []
+
+    def close(self):
+        """Close the archive, even if the generation failed; closing it again has no effect."""
+        self.__archive.close()
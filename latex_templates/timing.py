@@ -0,0 +1,163 @@
+"""
+Timing of the stages of generating and compiling projects.
+
+Stages are delimited by ``span`` context managers, which report their duration
+to the current collector.  No collector is installed by default, in which case
+spans cost next to nothing.  Any object with a ``record(span)`` method may be
+used as a collector, e.g. to forward the spans to a tracing system.
+
+Stages recorded by the package:
+
+load-config
+  Loading a config file
+load-default-conf
+  Loading the default config of a template
+find-template
+  Looking up a template in the template path
+validate
+  Validating a config against the schema of its template
+render-contents
+  Rendering the contents template into the list of generated files
+render
+  Rendering (and writing) a file template
+copy
+  Copying a raw file
+latexmk
+  Running latexmk on a generated project
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, TextIO
+
+__all__ = ["Span", "TimingCollector", "get_collector", "set_collector", "span"]
+
+
+class Span(NamedTuple):
+    stage: str
+    detail: Optional[str]
+    start: float
+    duration: float
+    thread: str
+
+
+class StageSummary(NamedTuple):
+    count: int
+    total: float
+    mean: float
+    max: float
+
+
+class TimingCollector:
+    """Thread-safe collector keeping all spans in memory, e.g. for the ``--timings`` option."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.__lock = threading.Lock()
+
+    def record(self, span: Span):
+        with self.__lock:
+            self.spans.append(span)
+
+    def summary(self) -> Dict[str, StageSummary]:
+        """Aggregate the spans by stage, in the order each stage was first completed."""
+        durations: Dict[str, List[float]] = {}
+        with self.__lock:
+            for span in self.spans:
+                durations.setdefault(span.stage, []).append(span.duration)
+        return {
+            stage: StageSummary(len(d), sum(d), sum(d) / len(d), max(d))
+            for stage, d in durations.items()
+        }
+
+    def format_table(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        lines = [
+            f"{'stage':<20} {'count':>7} {'total ms':>10} {'mean ms':>10} {'max ms':>10}"
+        ]
+        for stage, s in self.summary().items():
+            lines.append(
+                f"{stage:<20} {s.count:>7} {1000 * s.total:>10.1f} "
+                f"{1000 * s.mean:>10.2f} {1000 * s.max:>10.2f}"
+            )
+        lines.append(f"{'elapsed':<20} {'':>7} {1000 * elapsed:>10.1f}")
+        return "\n".join(lines)
+
+    def to_json(self) -> Dict[str, Any]:
+        with self.__lock:
+            spans = list(self.spans)
+        return {
+            "elapsed": time.perf_counter() - self.started,
+            "stages": {
+                stage: summary._asdict() for stage, summary in self.summary().items()
+            },
+            "spans": [
+                {**span._asdict(), "start": span.start - self.started} for span in spans
+            ],
+        }
+
+    def write_json(self, out: TextIO):
+        json.dump(self.to_json(), out, indent=2)
+        out.write("\n")
+
+
+_collector = None
+
+
+def get_collector():
+    return _collector
+
+
+def set_collector(collector) -> Any:
+    """Install the collector receiving all spans (or None to disable timing), returning the previous one."""
+    global _collector
+    previous, _collector = _collector, collector
+    return previous
+
+
+class _Span:
+    __slots__ = ("stage", "detail", "collector", "start")
+
+    def __init__(self, stage: str, detail: Optional[str], collector):
+        self.stage = stage
+        self.detail = detail
+        self.collector = collector
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        self.collector.record(
+            Span(
+                self.stage,
+                self.detail,
+                self.start,
+                duration,
+                threading.current_thread().name,
+            )
+        )
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage: str, detail: Any = None):
+    """Context manager timing a stage, reported to the current collector if there is one."""
+    collector = _collector
+    if collector is None:
+        return _NULL_SPAN
+    return _Span(stage, None if detail is None else str(detail), collector)
@@ -0,0 +1,308 @@
+"""
+Regenerating a project whenever its config or template sources change.
+
+Changes are detected with inotify on Linux, and by polling modification times
+elsewhere.  The generated project may be compiled continuously by a long-running
+``latexmk -pvc`` process, which picks up the regenerated files by itself.
+"""
+
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, NamedTuple, Optional, Union
+
+from .build import latexmk_command
+from .configs import load_config
+
+if TYPE_CHECKING:
+    import subprocess
+
+__all__ = [
+    "InotifyWatcher",
+    "PollingWatcher",
+    "WatchedPath",
+    "open_watcher",
+    "watch_project",
+]
+
+DEFAULT_DEBOUNCE = 0.2
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+class WatchedPath(NamedTuple):
+    """Directory to be watched, optionally restricted to some of its entries."""
+
+    directory: Path
+    recursive: bool = True
+    names: Optional[FrozenSet[str]] = None
+
+    def is_relevant(self, name: str) -> bool:
+        return self.names is None or name in self.names
+
+
+class PollingWatcher:
+    """Detects changes by periodically comparing the modification times and sizes of files."""
+
+    def __init__(
+        self, paths: Iterable[WatchedPath], interval: float = DEFAULT_POLL_INTERVAL
+    ):
+        self.paths = list(paths)
+        self.interval = interval
+        self.__snapshot = self.__take_snapshot()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until some watched file changes, returning False if the timeout expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.__take_snapshot()
+            if snapshot != self.__snapshot:
+                self.__snapshot = snapshot
+                return True
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(self.interval, remaining))
+            else:
+                time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+    def __take_snapshot(self) -> Dict[str, tuple]:
+        snapshot = {}
+        for path in self.paths:
+            if not path.directory.is_dir():
+                continue
+            walk = os.walk(str(path.directory))
+            if not path.recursive:
+                walk = [next(walk, (str(path.directory), [], []))]
+            for root, _, files in walk:
+                for name in files:
+                    if root == str(path.directory) and not path.is_relevant(name):
+                        continue
+                    filename = os.path.join(root, name)
+                    try:
+                        stat = os.stat(filename)
+                    except OSError:
+                        continue
+                    snapshot[filename] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+
+class InotifyWatcher:
+    """Detects changes with the inotify API of Linux, accessed through ctypes."""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    MASK = (
+        IN_MODIFY
+        | IN_ATTRIB
+        | IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+    )
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, paths: Iterable[WatchedPath]):
+        import ctypes
+        import ctypes.util
+
+        library = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+
+        self.__libc = libc
+        self.__fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.__watches: Dict[int, WatchedPath] = {}
+        self.__roots: Dict[int, bool] = {}
+        for path in paths:
+            self.__add(path.directory, path, is_root=True)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until some watched file changes, returning False if the timeout expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = (
+                None if deadline is None else max(0, deadline - time.monotonic())
+            )
+            ready, _, _ = select.select([self.__fd], [], [], remaining)
+            if not ready:
+                return False
+            if self.__read_events():
+                return True
+
+    def close(self):
+        os.close(self.__fd)
+
+    def __add(self, directory: Path, path: WatchedPath, is_root: bool):
+        if not directory.is_dir():
+            return
+        wd = self.__libc.inotify_add_watch(
+            self.__fd, os.fsencode(str(directory)), self.MASK
+        )
+        if wd < 0:
+            return
+        self.__watches[wd] = path._replace(directory=directory)
+        self.__roots[wd] = is_root
+
+        if path.recursive:
+            for child in directory.iterdir():
+                if child.is_dir() and (not is_root or path.is_relevant(child.name)):
+                    self.__add(child, path, is_root=False)
+
+    def __read_events(self) -> bool:
+        try:
+            data = os.read(self.__fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+
+        relevant = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            path = self.__watches.get(wd)
+            if path is None or (self.__roots[wd] and not path.is_relevant(name)):
+                continue
+            relevant = True
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                if path.recursive:
+                    self.__add(path.directory / name, path, is_root=False)
+        return relevant
+
+
+def open_watcher(paths: Iterable[WatchedPath]) -> Union[InotifyWatcher, PollingWatcher]:
+    """Watch the given paths with inotify if available, otherwise by polling."""
+    paths = list(paths)
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths)
+
+
+def watch_project(
+    template,
+    config_file: Union[str, Path],
+    output_dir: Union[str, Path],
+    *,
+    build: bool = True,
+    debounce: float = DEFAULT_DEBOUNCE,
+    verbose: bool = False,
+):
+    """Generate a project and regenerate it whenever the config or template sources change.
+
+    Runs until interrupted.  Only the files whose inputs changed are rendered
+    again, and only those whose contents changed are written.
+
+    :param template:
+    The ``ProjectTemplate`` to be instantiated.
+
+    :param config_file:
+    Configuration file for the template.
+
+    :param output_dir:
+    Directory where the project is generated.
+
+    :param build:
+    If true, compile the project continuously with ``latexmk -pvc``.
+
+    :param debounce:
+    Number of seconds without further changes to wait for before regenerating,
+    so that bursts of changes (e.g. when saving several files) trigger a single
+    regeneration.
+    """
+    import subprocess
+
+    config_file, output_dir = Path(config_file).resolve(), Path(output_dir)
+    paths = [
+        WatchedPath(
+            config_file.parent, recursive=False, names=frozenset([config_file.name])
+        ),
+        WatchedPath(template.root_dir),
+    ]
+    paths.extend(WatchedPath(Path(directory)) for directory in template.lib_path)
+
+    watcher = open_watcher(paths)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    latexmk: Optional["subprocess.Popen"] = None
+    main_file: Optional[Path] = None
+    if verbose:
+        print(f"Watching with {type(watcher).__name__}")
+
+    try:
+        while True:
+            try:
+                config = load_config(config_file)
+                report = template.generate(config, output_dir)
+                print(f"Generated {output_dir}: {report}")
+
+                new_main_file = template.get_main_latex_file(config) if build else None
+            except Exception as e:
+                print(f"Generation failed: {e}", file=sys.stderr)
+                new_main_file = main_file
+
+            if new_main_file is not None and (
+                latexmk is None
+                or latexmk.poll() is not None
+                or new_main_file != main_file
+            ):
+                _stop(latexmk)
+                main_file = new_main_file
+                latexmk = subprocess.Popen(
+                    latexmk_command(main_file.tgt, continuous=True),
+                    cwd=str(output_dir),
+                    stdin=subprocess.DEVNULL,
+                    stdout=None if verbose else subprocess.DEVNULL,
+                    start_new_session=True,
+                )
+
+            watcher.wait()
+            while watcher.wait(debounce):
+                pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _stop(latexmk)
+        watcher.close()
+
+
+def _stop(process: Optional["subprocess.Popen"]):
+    import subprocess
+
+    if process is not None and process.poll() is None:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except (AttributeError, ProcessLookupError, PermissionError):
+            process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()